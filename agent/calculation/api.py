@@ -2,13 +2,14 @@ from flask import Blueprint, request
 from twa import agentlogging
 from agent.calculation.area_weighted_sum import area_weighted_sum
 from agent.calculation.raster_area import raster_area
+from agent.calculation.raster_batch import raster_multi
 from agent.calculation.raster_count import raster_count
-from agent.calculation.simple_area import simple_area
+from agent.calculation.simple_area import simple_area, simple_area_multi
 from agent.calculation.trajectory import trajectory
-from agent.calculation.simple_count import simple_count
+from agent.calculation.simple_count import simple_count, simple_count_multi
 from agent.objects.calculation_metadata import get_calculation_metadata
 import agent.utils.constants as constants
-from agent.calculation.calculation_input import CalculationInput
+from agent.calculation.calculation_input import CalculationInput, MultiCalculationInput
 
 logger = agentlogging.get_logger('dev')
 calculation_blueprint = Blueprint('calculation_blueprint', __name__)
@@ -23,6 +24,15 @@ function_map = {
     constants.RASTER_AREA: raster_area
 }
 
+# calculation types that can evaluate several distances in a single pass
+multi_function_map = {
+    constants.SIMPLE_COUNT: simple_count_multi,
+    constants.SIMPLE_AREA: simple_area_multi,
+    constants.AREA_WEIGHTED_SUM: raster_multi,
+    constants.RASTER_COUNT: raster_multi,
+    constants.RASTER_AREA: raster_multi
+}
+
 CALCULATE_ROUTE = '/calculate_exposure'
 
 
@@ -36,6 +46,27 @@ def do_calculation(subject, calculation, exposure):
     return function_map[calculation_metadata.rdf_type](calculation_input)
 
 
+def do_multi_calculation(subject, calculations: list[str], exposure):
+    """
+    Evaluates several calculation instances of the same rdf_type, differing in distance
+    and/or dataset filter values, in a single pass over the subjects and exposure dataset
+    """
+    calculation_metadata_list = [get_calculation_metadata(
+        calculation) for calculation in calculations]
+
+    rdf_type = calculation_metadata_list[0].rdf_type
+    if any(m.rdf_type != rdf_type for m in calculation_metadata_list):
+        raise Exception('Calculations must have the same rdf_type')
+
+    if not isinstance(subject, list):
+        subject = [subject]
+
+    multi_input = MultiCalculationInput(
+        subject=subject, exposure=exposure, calculation_metadata_list=calculation_metadata_list)
+
+    return multi_function_map[rdf_type](multi_input)
+
+
 @calculation_blueprint.route(CALCULATE_ROUTE, methods=['POST'])
 # core agent, takes IRIs of calculation, subject, and exposure as inputs
 def api():
@@ -0,0 +1,138 @@
+# functions shared between batched calculations, where a chunk of subjects is answered by a single query
+import csv
+import io
+import queue
+import sys
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from itertools import islice
+from tqdm import tqdm
+import numpy as np
+import shapely
+from agent.utils.env_configs import CALCULATION_CHUNK_SIZE, CALCULATION_WORKERS, SUBJECT_STORE
+from agent.utils.postgis_client import postgis_client
+from twa import agentlogging
+
+logger = agentlogging.get_logger('dev')
+
+SUBJECT_TABLE = 'subject_table'
+
+
+def create_subject_table(cur, subject_table: str = SUBJECT_TABLE):
+    # session table, dropped automatically when the connection is closed
+    with open("agent/calculation/resources/subject_table.sql", "r") as f:
+        subject_table_sql = f.read()
+
+    cur.execute(subject_table_sql.format(SUBJECT_TABLE=subject_table))
+
+
+def load_subject_table(cur, subject_table: str, iri_to_geom_dict: dict, srid: int):
+    """
+    Replaces the content of the subject table with the given geometries using COPY
+    """
+    # hex encoded EWKB is read by the geometry input function without parsing text coordinates
+    ewkb_list = shapely.to_wkb(shapely.set_srid(np.array(list(iri_to_geom_dict.values()), dtype=object), srid),
+                               hex=True, include_srid=True)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(zip(iri_to_geom_dict, ewkb_list))
+    buffer.seek(0)
+
+    cur.execute(f"TRUNCATE {subject_table}")
+    cur.copy_expert(
+        f"COPY {subject_table} (subject, geom) FROM STDIN WITH (FORMAT csv)", buffer)
+    # row estimates for the planner
+    cur.execute(f"ANALYZE {subject_table}")
+
+
+def load_subject_table_from_store(cur, subject_table: str, subject: list, srid: int):
+    """
+    Replaces the content of the subject table with the stored geometries of the given subjects,
+    joined from subject_geometry on the server so that no geometry is sent by the agent
+    """
+    with open("agent/calculation/resources/subject_table_from_store.sql", "r") as f:
+        subject_table_sql = f.read()
+
+    cur.execute(f"TRUNCATE {subject_table}")
+    cur.execute(subject_table_sql.format(SUBJECT_TABLE=subject_table),
+                {'SRID_PLACEHOLDER': srid, 'SUBJECT_PLACEHOLDER': subject})
+    # row estimates for the planner
+    cur.execute(f"ANALYZE {subject_table}")
+
+
+def execute_batch(prepare_sql, iri_to_geom_dict: dict, srid: int, params: dict, cursor_factory=None, from_store: bool = False):
+    """
+    Splits the subjects into chunks and executes the batch SQL once per chunk on a pool of
+    at most CALCULATION_WORKERS connections, each with its own session tables, returns all rows.
+    prepare_sql is called once per connection with its cursor, e.g. to create a temp table,
+    and returns the batch SQL (formatted with SUBJECT_TABLE).
+    With from_store (and SUBJECT_STORE) the geometries of the chunk are joined from subject_geometry
+    and only the IRIs are sent, iri_to_geom_dict then holds the stored geometries, only projected
+    """
+    chunk_queue = queue.Queue()
+    for chunk in chunk_dict(iri_to_geom_dict, CALCULATION_CHUNK_SIZE):
+        chunk_queue.put(chunk)
+
+    num_workers = max(1, min(CALCULATION_WORKERS, chunk_queue.qsize()))
+    logger.info(
+        f'Executing {chunk_queue.qsize()} chunk(s) with {num_workers} connection(s)')
+
+    # set when a worker fails so that the others stop taking new chunks
+    stop_event = threading.Event()
+    progress_lock = threading.Lock()
+
+    with tqdm(total=chunk_queue.qsize(), mininterval=60, ncols=80, file=sys.stdout) as progress:
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            futures = [executor.submit(_execute_chunks, prepare_sql, chunk_queue, srid, params, cursor_factory,
+                                       from_store and SUBJECT_STORE, stop_event, progress, progress_lock)
+                       for _ in range(num_workers)]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            if any(f.exception() is not None for f in done):
+                stop_event.set()
+
+    rows = []
+    for future in futures:
+        # raises the exception of a failed worker
+        rows.extend(future.result())
+
+    return rows
+
+
+def _execute_chunks(prepare_sql, chunk_queue: queue.Queue, srid: int, params: dict, cursor_factory, from_store: bool,
+                    stop_event: threading.Event, progress: tqdm, progress_lock: threading.Lock):
+    rows = []
+    conn = postgis_client.connect()
+    try:
+        with conn:
+            with conn.cursor(cursor_factory=cursor_factory) as cur:
+                batch_sql = prepare_sql(cur)
+                create_subject_table(cur)
+
+                while not stop_event.is_set():
+                    try:
+                        chunk = chunk_queue.get_nowait()
+                    except queue.Empty:
+                        break
+
+                    if from_store:
+                        load_subject_table_from_store(
+                            cur, SUBJECT_TABLE, list(chunk), srid)
+                    else:
+                        load_subject_table(cur, SUBJECT_TABLE, chunk, srid)
+                    cur.execute(batch_sql, params)
+                    rows.extend(cur.fetchall())
+
+                    with progress_lock:
+                        progress.update(1)
+    finally:
+        # temp tables are dropped with the connection
+        conn.close()
+
+    return rows
+
+
+def chunk_dict(d: dict, chunk_size: int):
+    iterator = iter(d.items())
+    while chunk := dict(islice(iterator, chunk_size)):
+        yield chunk
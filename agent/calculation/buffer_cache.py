@@ -0,0 +1,105 @@
+# buffers of subject geometries kept as WKB between calculations, in memory (LRU) and optionally in PostGIS
+import hashlib
+import threading
+from collections import OrderedDict
+import shapely
+from psycopg2.extras import execute_values
+from agent.utils.env_configs import BUFFER_CACHE_SIZE, BUFFER_CACHE_TABLE
+from agent.utils.postgis_client import postgis_client
+from twa import agentlogging
+
+logger = agentlogging.get_logger('dev')
+
+# (geometry hash, distance, crs, quad_segs) -> WKB of the buffer, most recently used at the end
+_buffer_cache = OrderedDict()
+_buffer_cache_bytes = 0
+_buffer_cache_lock = threading.Lock()
+
+
+def get_buffers(wkb_to_geom_dict: dict, distance: float, crs: str, quad_segs: int, compute_buffers):
+    """
+    Returns a dictionary of geometry WKB to buffer for the given geometries,
+    compute_buffers(geoms) is called once with the geometries that are not cached yet
+    """
+    key_to_wkb = {(hashlib.sha1(wkb).hexdigest(), float(distance), crs, int(quad_segs)): wkb
+                  for wkb in wkb_to_geom_dict}
+
+    key_to_buffer_wkb = _get_from_memory(key_to_wkb.keys())
+
+    missing_keys = [key for key in key_to_wkb if key not in key_to_buffer_wkb]
+    if missing_keys and BUFFER_CACHE_TABLE:
+        stored = _get_from_table(missing_keys)
+        key_to_buffer_wkb.update(stored)
+        _put_in_memory(stored)
+        missing_keys = [key for key in missing_keys if key not in stored]
+
+    computed = {}
+    if missing_keys:
+        buffers = compute_buffers(
+            [wkb_to_geom_dict[key_to_wkb[key]] for key in missing_keys])
+        computed = dict(zip(missing_keys, shapely.to_wkb(buffers)))
+    if computed:
+        _put_in_memory(computed)
+        if BUFFER_CACHE_TABLE:
+            _put_in_table(computed)
+        key_to_buffer_wkb.update(computed)
+
+    logger.info(
+        f'Buffers: {len(key_to_wkb) - len(computed)} cached, {len(computed)} computed')
+
+    return {key_to_wkb[key]: shapely.from_wkb(buffer_wkb) for key, buffer_wkb in key_to_buffer_wkb.items()}
+
+
+def _get_from_memory(keys):
+    key_to_buffer_wkb = {}
+    with _buffer_cache_lock:
+        for key in keys:
+            if key in _buffer_cache:
+                _buffer_cache.move_to_end(key)
+                key_to_buffer_wkb[key] = _buffer_cache[key]
+    return key_to_buffer_wkb
+
+
+def _put_in_memory(key_to_buffer_wkb: dict):
+    global _buffer_cache_bytes
+    with _buffer_cache_lock:
+        for key, buffer_wkb in key_to_buffer_wkb.items():
+            if key in _buffer_cache:
+                _buffer_cache_bytes -= len(_buffer_cache[key])
+            _buffer_cache[key] = buffer_wkb
+            _buffer_cache.move_to_end(key)
+            _buffer_cache_bytes += len(buffer_wkb)
+
+        # evict least recently used buffers beyond the memory budget (MB)
+        while _buffer_cache and _buffer_cache_bytes > BUFFER_CACHE_SIZE * 1024 * 1024:
+            _, buffer_wkb = _buffer_cache.popitem(last=False)
+            _buffer_cache_bytes -= len(buffer_wkb)
+
+
+def _get_from_table(keys: list):
+    with open("agent/calculation/resources/buffer_cache.sql", "r") as f:
+        buffer_cache_sql = f.read()
+
+    # keys of one call share distance, crs and quad_segs
+    _, distance, crs, quad_segs = keys[0]
+    with postgis_client.connect() as conn:
+        with conn.cursor() as cur:
+            # concurrent CREATE TABLE IF NOT EXISTS can fail, serialise it
+            cur.execute(
+                "SELECT pg_advisory_xact_lock(hashtext('buffer_cache'))")
+            cur.execute(buffer_cache_sql)
+            cur.execute("""
+                SELECT geometry_hash, buffer FROM buffer_cache
+                WHERE distance = %s AND crs = %s AND quad_segs = %s AND geometry_hash = ANY(%s)
+                """, (distance, crs, quad_segs, [key[0] for key in keys]))
+            return {(geometry_hash, distance, crs, quad_segs): bytes(buffer) for geometry_hash, buffer in cur.fetchall()}
+
+
+def _put_in_table(key_to_buffer_wkb: dict):
+    with postgis_client.connect() as conn:
+        with conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO buffer_cache (geometry_hash, distance, crs, quad_segs, buffer)
+                VALUES %s
+                ON CONFLICT DO NOTHING
+                """, [(key[0], key[1], key[2], key[3], buffer_wkb) for key, buffer_wkb in key_to_buffer_wkb.items()])
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from agent.objects.calculation_metadata import CalculationMetadata
 
 
@@ -7,3 +7,37 @@ class CalculationInput:
     subject: str | list[str]
     exposure: str
     calculation_metadata: CalculationMetadata
+
+
+@dataclass
+class MultiCalculationInput:
+    # several calculations of the same rdf_type evaluated in a single pass,
+    # differing in distance and/or dataset filter values (same filter columns)
+    subject: list[str]
+    exposure: str
+    calculation_metadata_list: list[CalculationMetadata]
+    dataset_filters: list[dict] = field(init=False)
+    distances: list[float] = field(init=False)
+
+    def __post_init__(self):
+        # unique dataset filters, results are grouped by the position of the filter in this list
+        self.dataset_filters = []
+        for calculation_metadata in self.calculation_metadata_list:
+            if calculation_metadata.dataset_filter not in self.dataset_filters:
+                self.dataset_filters.append(calculation_metadata.dataset_filter)
+
+        if any(d.keys() != self.dataset_filters[0].keys() for d in self.dataset_filters):
+            raise Exception('Calculations must have the same dataset filter columns')
+
+        self.distances = sorted({float(m.distance)
+                                for m in self.calculation_metadata_list})
+
+        self._key_to_calculation = {(float(m.distance), self.dataset_filters.index(m.dataset_filter)): m
+                                    for m in self.calculation_metadata_list}
+
+    def get_calculation_metadata(self, distance: float, filter_index: int) -> CalculationMetadata | None:
+        # returns None for combinations of distance and filter that were not requested
+        return self._key_to_calculation.get((float(distance), filter_index))
+
+    def get_calculation_input(self, calculation_metadata: CalculationMetadata) -> CalculationInput:
+        return CalculationInput(subject=self.subject, exposure=self.exposure, calculation_metadata=calculation_metadata)
@@ -0,0 +1,146 @@
+# persistent projected and indexed copies of vector exposure datasets, shared between requests
+import hashlib
+import json
+from agent.calculation.shared_utils import create_vector_temp_table, get_dataset_filter_sql, get_extent_wkb
+from agent.objects.exposure_dataset import ExposureDataset
+from agent.utils import constants
+from agent.utils.env_configs import EXPOSURE_CACHE
+from agent.utils.postgis_client import postgis_client
+from twa import agentlogging
+
+logger = agentlogging.get_logger('dev')
+
+
+def get_shared_exposure_table(exposure_dataset: ExposureDataset, dataset_filters: list[dict]):
+    # the persistent cache can be resolved once and used by all connections, None if temp tables are used instead
+    if EXPOSURE_CACHE:
+        return prepare_exposure_cache(exposure_dataset, dataset_filters, 3857)
+    return None
+
+
+def get_vector_exposure_table(cur, exposure_dataset: ExposureDataset, dataset_filters: list[dict], iri_to_point_dict: dict, distance: float):
+    """
+    Returns the name of a table holding the exposure dataset in EPSG:3857 with columns
+    wkb_geometry and filter_index, either the persistent cache or a temp table on cur,
+    the temp table only holds features within distance of the subjects' bounding box
+    """
+    if EXPOSURE_CACHE:
+        return prepare_exposure_cache(exposure_dataset, dataset_filters, 3857)
+    else:
+        extent_wkb = get_extent_wkb(
+            list(iri_to_point_dict.values()), distance, "EPSG:3857")
+        return create_vector_temp_table(cur, exposure_dataset, dataset_filters, extent_wkb)
+
+
+def prepare_exposure_cache(exposure_dataset: ExposureDataset, dataset_filters: list[dict], srid: int, extra_columns: list[str] = None):
+    """
+    Builds an UNLOGGED copy of the exposure dataset projected to srid if it does not exist
+    or if the source table has changed since it was built, returns the name of the cache table.
+    extra_columns are additional select expressions (e.g. "area_column AS area") copied into the cache
+    """
+    if extra_columns is None:
+        extra_columns = []
+
+    if exposure_dataset.geometry_column is not None:
+        geometry_column = exposure_dataset.geometry_column
+    else:
+        geometry_column = constants.VECTOR_GEOMETRY_COLUMN
+
+    dataset_filter_key = json.dumps(dataset_filters, sort_keys=True, default=str)
+    cache_key = "|".join(
+        [exposure_dataset.table_name, geometry_column, str(srid), dataset_filter_key] + extra_columns)
+    cache_table = 'exposure_cache_' + \
+        hashlib.md5(cache_key.encode()).hexdigest()[:16]
+
+    with open("agent/calculation/resources/exposure_cache.sql", "r") as f:
+        exposure_cache_sql = f.read()
+
+    with open("agent/calculation/resources/source_fingerprint.sql", "r") as f:
+        source_fingerprint_sql = f.read()
+
+    # a separate connection is used so that the cache is committed (and locks released) before the calculation starts
+    with postgis_client.connect() as conn:
+        with conn.cursor() as cur:
+            # concurrent CREATE TABLE IF NOT EXISTS can fail, serialise it
+            cur.execute(
+                "SELECT pg_advisory_xact_lock(hashtext('exposure_cache'))")
+            cur.execute(exposure_cache_sql)
+
+    with postgis_client.connect() as conn:
+        with conn.cursor() as cur:
+            # workers building the same cache wait for each other, the later ones reuse the result
+            cur.execute(
+                "SELECT pg_advisory_xact_lock(hashtext(%s))", (cache_table,))
+
+            cur.execute(source_fingerprint_sql.format(
+                EXPOSURE_DATASET=exposure_dataset.table_name))
+            source_fingerprint = cur.fetchone()[0]
+
+            cur.execute("""
+                SELECT source_fingerprint, row_count FROM exposure_cache
+                WHERE cache_table = %s AND to_regclass(cache_table) IS NOT NULL
+                """, (cache_table,))
+            row = cur.fetchone()
+
+            if row is not None and row[0] == source_fingerprint:
+                # UNLOGGED tables are emptied after a crash or failover, the bookkeeping row is kept
+                if row[1] == 0 or _has_rows(cur, cache_table):
+                    return cache_table
+                logger.info(
+                    f"Exposure cache {cache_table} is empty, e.g. after a crash of the database")
+
+            _drop_stale_caches(
+                cur, exposure_dataset.table_name, source_fingerprint, cache_table)
+
+            logger.info(
+                f"Building exposure cache {cache_table} for {exposure_dataset.table_name}, SRID {srid}, filters {dataset_filters}")
+            _build_cache_table(cur, cache_table, exposure_dataset,
+                               geometry_column, dataset_filters, srid, extra_columns)
+            cur.execute(f"SELECT count(*) FROM {cache_table}")
+            row_count = cur.fetchone()[0]
+
+            cur.execute("""
+                INSERT INTO exposure_cache (cache_table, dataset_table, geometry_column, srid, dataset_filter, source_fingerprint, row_count)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (cache_table)
+                DO UPDATE SET source_fingerprint = EXCLUDED.source_fingerprint,
+                              row_count = EXCLUDED.row_count,
+                              created_at = now()
+                """, (cache_table, exposure_dataset.table_name, geometry_column, srid, dataset_filter_key, source_fingerprint, row_count))
+
+    return cache_table
+
+
+def _has_rows(cur, cache_table: str):
+    cur.execute(f"SELECT EXISTS (SELECT 1 FROM {cache_table})")
+    return cur.fetchone()[0]
+
+
+def _drop_stale_caches(cur, table_name: str, source_fingerprint: str, cache_table: str):
+    # copies of an older version of the source are never used again
+    cur.execute("""
+        DELETE FROM exposure_cache
+        WHERE dataset_table = %s AND source_fingerprint IS DISTINCT FROM %s AND cache_table <> %s
+        RETURNING cache_table
+        """, (table_name, source_fingerprint, cache_table))
+    for (stale_table,) in cur.fetchall():
+        logger.info(f"Dropping stale exposure cache {stale_table}")
+        cur.execute(f"DROP TABLE IF EXISTS {stale_table}")
+
+
+def _build_cache_table(cur, cache_table: str, exposure_dataset: ExposureDataset, geometry_column: str, dataset_filters: list[dict], srid: int,
+                       extra_columns: list[str]):
+    with open("agent/calculation/resources/exposure_cache_table.sql", "r") as f:
+        cache_table_sql = f.read()
+
+    filter_index, filter_condition, params = get_dataset_filter_sql(
+        dataset_filters)
+    where_clause = ''
+    if params:
+        where_clause = f"WHERE {filter_condition}"
+
+    cur.execute(f"DROP TABLE IF EXISTS {cache_table}")
+    cur.execute(cache_table_sql.format(CACHE_TABLE=cache_table, EXPOSURE_DATASET=exposure_dataset.table_name,
+                                       GEOMETRY_COLUMN=geometry_column, SRID=srid, FILTER_INDEX=filter_index,
+                                       EXTRA_COLUMNS="".join("\n    " + c + "," for c in extra_columns),
+                                       DATASET_FILTERS=where_clause), params)
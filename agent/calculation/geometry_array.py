@@ -0,0 +1,79 @@
+# vectorised operations on arrays of shapely geometries, coordinates are transformed in one pyproj call per batch
+from functools import lru_cache
+import numpy as np
+import psycopg2
+import shapely
+from pyproj import Transformer
+
+# scale error of UTM grows with the distance from the central meridian, about 0.1% at 3 degrees
+# (the edge of a zone) and 0.5% at 6 degrees at the equator
+UTM_MAX_OFFSET = 6
+
+# segments per quarter circle of buffers, 16 is the default of BaseGeometry.buffer (shapely.buffer uses 8)
+BUFFER_QUAD_SEGS = 16
+
+
+@lru_cache(maxsize=64)
+def get_transformer(from_crs: str, to_crs: str):
+    # creating a Transformer is expensive, instances are shared per CRS pair
+    return Transformer.from_crs(from_crs, to_crs, always_xy=True)
+
+
+def transform_geometries(geoms, from_crs: str, to_crs: str):
+    """
+    Returns an array of the geometries reprojected from from_crs to to_crs,
+    all coordinates of the batch go through pyproj in a single call
+    """
+    # new array so that the caller's geometries are left untouched
+    geoms = np.array(geoms, dtype=object)
+    if len(geoms) == 0:
+        return geoms
+
+    coords = shapely.get_coordinates(geoms)
+    x, y = get_transformer(from_crs, to_crs).transform(
+        coords[:, 0], coords[:, 1])
+    return shapely.set_coordinates(geoms, np.column_stack([x, y]))
+
+
+def transform_xy(x, y, from_crs: str, to_crs: str):
+    # returns points for coordinate arrays, e.g. the samples of a trajectory
+    x, y = get_transformer(from_crs, to_crs).transform(
+        np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    return shapely.points(x, y)
+
+
+def buffer_geometries(geoms, distance: float, buffer_crs: str, crs: str, quad_segs: int = BUFFER_QUAD_SEGS):
+    """
+    Buffers geometries given in crs by distance (in units of buffer_crs),
+    the buffers are computed in buffer_crs and returned in crs
+    """
+    projected = transform_geometries(geoms, crs, buffer_crs)
+    return transform_geometries(shapely.buffer(projected, distance, quad_segs=quad_segs), buffer_crs, crs)
+
+
+def get_utm_srid(geoms, centroid):
+    """
+    Returns the SRID of the WGS 84 UTM zone of centroid (EPSG:4326) if all geometries are within
+    UTM_MAX_OFFSET degrees of longitude from the central meridian of the zone and within the
+    latitudes covered by UTM, otherwise None
+    """
+    if not -80 <= centroid.y <= 84:
+        return None
+
+    zone = min(int((centroid.x + 180) // 6) + 1, 60)
+    central_meridian = zone * 6 - 183
+    minx, miny, maxx, maxy = shapely.total_bounds(geoms)
+    if miny < -80 or maxy > 84 or max(central_meridian - minx, maxx - central_meridian) > UTM_MAX_OFFSET:
+        return None
+
+    return (32600 if centroid.y >= 0 else 32700) + zone
+
+
+def to_wkb_params(geoms):
+    # WKB of all geometries in one call, bound as bytea for ST_GeomFromWKB
+    return [psycopg2.Binary(wkb) for wkb in shapely.to_wkb(np.array(geoms, dtype=object))]
+
+
+def from_wkb_values(values):
+    # decodes bytea values, e.g. results of ST_AsBinary, in one call
+    return shapely.from_wkb(np.array([bytes(v) for v in values], dtype=object))
@@ -0,0 +1,70 @@
+# per-subject queries batched into one statement, PIPELINE_DEPTH subjects are evaluated per round trip
+import re
+import sys
+from tqdm import tqdm
+from agent.utils.env_configs import PIPELINE_DEPTH, PREPARED_STATEMENTS
+
+PLACEHOLDER_PATTERN = re.compile(r"%\((\w+)\)s")
+
+
+def execute_per_subject(cur, name: str, sql: str, key_to_params: dict):
+    """
+    Executes sql (a single SELECT with %(NAME)s placeholders) once per key and returns
+    a dictionary of key to the fetched rows.
+    With PREPARED_STATEMENTS the parameters of PIPELINE_DEPTH keys are sent as arrays and
+    the query is evaluated for each of them via unnest and a lateral join, in one statement,
+    otherwise the query is sent for every key. A failing subject fails its whole chunk
+    """
+    if not PREPARED_STATEMENTS:
+        key_to_rows = {}
+        for key, params in tqdm(key_to_params.items(), mininterval=60, ncols=80, file=sys.stdout):
+            cur.execute(sql, params)
+            key_to_rows[key] = cur.fetchall() if cur.description else []
+        return key_to_rows
+
+    if not key_to_params:
+        return {}
+
+    # parameters shared by all keys (distance, srid, filters) stay scalar, the others are unnested
+    first_params = next(iter(key_to_params.values()))
+    varying = [p for p in dict.fromkeys(PLACEHOLDER_PATTERN.findall(sql))
+               if any(not (params[p] is first_params[p] or params[p] == first_params[p])
+                      for params in key_to_params.values())]
+
+    def to_column(match):
+        return f"{name}_params.p_{match.group(1).lower()}" if match.group(1) in varying else match.group(0)
+
+    query = PLACEHOLDER_PATTERN.sub(to_column, sql.strip().rstrip(';'))
+    unnest_args = ", ".join(["%(PIPELINE_KEYS)s::text[]"] +
+                            [f"%(PIPELINE_{p})s" for p in varying])
+    unnest_columns = ", ".join(["pipeline_key"] +
+                               [f"p_{p.lower()}" for p in varying])
+    # the key is returned with every row so that results can be matched to the subjects
+    batch_sql = (f"SELECT {name}_params.pipeline_key, q.*\n"
+                 f"FROM unnest({unnest_args}) AS {name}_params({unnest_columns})\n"
+                 f"CROSS JOIN LATERAL (\n{query}\n) q")
+
+    # chunked here rather than with batch_utils.chunk_dict, which would connect to the stack on import
+    items = list(key_to_params.items())
+    chunks = [dict(items[i:i + PIPELINE_DEPTH])
+              for i in range(0, len(items), PIPELINE_DEPTH)]
+
+    str_to_key = {str(key): key for key in key_to_params}
+    key_to_rows = {key: [] for key in key_to_params}
+    for chunk in tqdm(chunks, mininterval=60, ncols=80, file=sys.stdout):
+        batch_params = dict(first_params)
+        batch_params['PIPELINE_KEYS'] = [str(key) for key in chunk]
+        for p in varying:
+            batch_params[f"PIPELINE_{p}"] = [params[p]
+                                             for params in chunk.values()]
+        cur.execute(batch_sql, batch_params)
+
+        for row in cur.fetchall():
+            if isinstance(row, dict):
+                key = str_to_key[row['pipeline_key']]
+                key_to_rows[key].append(
+                    {k: v for k, v in row.items() if k != 'pipeline_key'})
+            else:
+                key_to_rows[str_to_key[row[0]]].append(row[1:])
+
+    return key_to_rows
@@ -1,11 +1,13 @@
 from agent.calculation.calculation_input import CalculationInput
-from agent.calculation.shared_utils import get_iri_to_buffer_dict, instantiate_result_ontop
+from agent.calculation.geometry_array import to_wkb_params
+from agent.calculation.prepared_statement import execute_per_subject
+from agent.calculation.raster_batch import raster_batch
+from agent.calculation.shared_utils import fan_out, group_by_geometry, get_iri_to_buffer_dict, instantiate_result_ontop
 from agent.objects.exposure_dataset import get_exposure_dataset
 from agent.utils import constants
+from agent.utils.env_configs import BATCH_CALCULATION
 from agent.utils.postgis_client import postgis_client
 from twa import agentlogging
-from tqdm import tqdm
-import sys
 from agent.objects.exposure_value import ExposureValue
 from agent.utils.constants import METRE_SQUARED
 from psycopg2.extras import RealDictCursor
@@ -16,6 +18,8 @@ logger = agentlogging.get_logger('dev')
 def raster_area(calculation_input: CalculationInput):
     iri_to_buffer_dict = get_iri_to_buffer_dict(
         subject=calculation_input.subject, distance=calculation_input.calculation_metadata.distance)
+    # identical geometries are calculated once
+    iri_to_buffer_dict, representative_to_iris = group_by_geometry(iri_to_buffer_dict)
     exposure_dataset = get_exposure_dataset(calculation_input.exposure)
 
     with open("agent/calculation/resources/raster_area.sql", "r") as f:
@@ -37,22 +41,29 @@ def raster_area(calculation_input: CalculationInput):
 
     logger.info('Submitting SQL queries for calculations')
     subject_to_result_dict = {}
-    with postgis_client.connect() as conn:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # get clipped pixels
-            for iri, buffer in tqdm(iri_to_buffer_dict.items(), mininterval=60, ncols=80, file=sys.stdout):
-                params['GEOMETRY_PLACEHOLDER'] = buffer.wkt
-
-                cur.execute(raster_area_sql, params)
-                if cur.description:
-                    query_result = cur.fetchall()
-                    subject_to_result_dict[iri] = ExposureValue(
-                        value=query_result[0]['result'], unit=METRE_SQUARED)
-                else:
-                    raise Exception('Something wrong?')
+    # a list of subjects is answered chunk by chunk, a single subject keeps the per-subject query
+    if BATCH_CALCULATION and isinstance(calculation_input.subject, list):
+        iri_to_result_dict = raster_batch(iri_to_buffer_dict, exposure_dataset, geometry_column,
+                                          constants.RASTER_AREA, where_clauses, params)
+        for iri, result in iri_to_result_dict.items():
+            subject_to_result_dict[iri] = ExposureValue(
+                value=result, unit=METRE_SQUARED)
+    else:
+        with postgis_client.connect() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                # get clipped pixels
+                wkb_params = to_wkb_params(list(iri_to_buffer_dict.values()))
+                key_to_params = {iri: {**params, 'GEOMETRY_PLACEHOLDER': wkb}
+                                 for iri, wkb in zip(iri_to_buffer_dict, wkb_params)}
+                for iri, query_result in execute_per_subject(cur, 'raster_area', raster_area_sql, key_to_params).items():
+                    if query_result:
+                        subject_to_result_dict[iri] = ExposureValue(
+                            value=query_result[0]['result'], unit=METRE_SQUARED)
+                    else:
+                        raise Exception('Something wrong?')
 
     logger.info('Instantiating results')
-    instantiate_result_ontop(subject_to_result_dict, calculation_input)
+    instantiate_result_ontop(fan_out(subject_to_result_dict, representative_to_iris), calculation_input)
 
     complete_message = 'Completed calculation for raster area'
     logger.info(complete_message)
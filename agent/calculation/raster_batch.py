@@ -0,0 +1,115 @@
+# batched zonal statistics shared between the raster calculation types
+from agent.calculation.batch_utils import SUBJECT_TABLE, execute_batch
+from agent.calculation.calculation_input import MultiCalculationInput
+from agent.calculation.shared_utils import fan_out, group_by_geometry, get_dataset_filter_sql, get_iri_to_buffer_dict, instantiate_result_ontop
+from agent.objects.exposure_dataset import ExposureDataset, get_exposure_dataset
+from agent.objects.exposure_value import ExposureValue
+from agent.utils import constants
+from psycopg2.extras import RealDictCursor
+from twa import agentlogging
+
+logger = agentlogging.get_logger('dev')
+
+# expression summed over the clipped tiles of each subject, c.area is only available if the area column is selected
+rdf_type_to_aggregate = {
+    constants.AREA_WEIGHTED_SUM: '(ST_SummaryStats(c.clipped)).sum * c.area',
+    constants.RASTER_AREA: '(ST_SummaryStats(c.clipped)).count * c.area',
+    constants.RASTER_COUNT: '(ST_SummaryStats(c.clipped)).count'
+}
+
+rdf_type_to_unit = {
+    constants.AREA_WEIGHTED_SUM: constants.METRE_SQUARED,
+    constants.RASTER_AREA: constants.METRE_SQUARED,
+    constants.RASTER_COUNT: ''
+}
+
+
+def raster_batch(iri_to_buffer_dict: dict, exposure_dataset: ExposureDataset, geometry_column: str, rdf_type: str, dataset_filters: list[str], params: dict):
+    """
+    Buffers (EPSG:4326) are copied into a session table in chunks, each chunk is intersected
+    with the raster tiles and aggregated per subject in a single statement.
+    Returns a dictionary of subject IRI to the raw result
+    """
+    with open("agent/calculation/resources/raster_batch.sql", "r") as f:
+        raster_batch_sql = f.read()
+
+    raster_batch_sql = raster_batch_sql.format(SUBJECT_TABLE=SUBJECT_TABLE, EXPOSURE_DATASET=exposure_dataset.table_name,
+                                               GEOMETRY_COLUMN=geometry_column, EXTRA_COLUMNS=_get_extra_columns(
+                                                   rdf_type, exposure_dataset),
+                                               DATASET_FILTERS="\n".join(dataset_filters), AGGREGATE=rdf_type_to_aggregate[rdf_type])
+
+    subject_to_result_dict = {}
+    for row in execute_batch(lambda cur: raster_batch_sql, iri_to_buffer_dict, 4326, params, cursor_factory=RealDictCursor):
+        subject_to_result_dict[row['subject']] = row['result']
+
+    return subject_to_result_dict
+
+
+def raster_multi(multi_input: MultiCalculationInput):
+    """
+    Raster calculation for several distances and dataset filters, the tiles of all dataset
+    filters are read in one pass per distance. Buffers are the same as for single calculations
+    """
+    rdf_type = multi_input.calculation_metadata_list[0].rdf_type
+    unit = rdf_type_to_unit[rdf_type]
+
+    exposure_dataset = get_exposure_dataset(multi_input.exposure)
+
+    with open("agent/calculation/resources/raster_multi.sql", "r") as f:
+        raster_multi_sql = f.read()
+
+    filter_index, filter_condition, params = get_dataset_filter_sql(
+        multi_input.dataset_filters, alias='r.')
+
+    if exposure_dataset.geometry_column is not None:
+        geometry_column = exposure_dataset.geometry_column
+    else:
+        geometry_column = constants.RASTER_GEOMETRY_COLUMN
+
+    raster_multi_sql = raster_multi_sql.format(SUBJECT_TABLE=SUBJECT_TABLE, EXPOSURE_DATASET=exposure_dataset.table_name,
+                                               GEOMETRY_COLUMN=geometry_column, EXTRA_COLUMNS=_get_extra_columns(
+                                                   rdf_type, exposure_dataset),
+                                               FILTER_INDEX=filter_index, DATASET_FILTERS=filter_condition,
+                                               AGGREGATE=rdf_type_to_aggregate[rdf_type])
+
+    calculation_to_result_dict = {
+        m.iri: {} for m in multi_input.calculation_metadata_list}
+
+    logger.info('Submitting SQL queries for calculations')
+    for distance in multi_input.distances:
+        # EPSG:4326, built and cached by the same function as for single calculations
+        iri_to_buffer_dict = get_iri_to_buffer_dict(
+            subject=multi_input.subject, distance=distance)
+        # identical geometries are calculated once
+        iri_to_buffer_dict, representative_to_iris = group_by_geometry(
+            iri_to_buffer_dict)
+
+        # combinations without any tile do not appear in the query result
+        filter_to_result_dict = {i: {iri: ExposureValue(value=0, unit=unit) for iri in iri_to_buffer_dict}
+                                 for i in range(len(multi_input.dataset_filters))}
+        for row in execute_batch(lambda cur: raster_multi_sql, iri_to_buffer_dict, 4326, params, cursor_factory=RealDictCursor):
+            filter_to_result_dict[row['filter_index']][row['subject']] = ExposureValue(
+                value=row['result'], unit=unit)
+
+        for i, subject_to_result_dict in filter_to_result_dict.items():
+            calculation_metadata = multi_input.get_calculation_metadata(
+                distance, i)
+            if calculation_metadata is not None:
+                calculation_to_result_dict[calculation_metadata.iri] = fan_out(
+                    subject_to_result_dict, representative_to_iris)
+
+    logger.info('Instantiating results')
+    for calculation_metadata in multi_input.calculation_metadata_list:
+        instantiate_result_ontop(calculation_to_result_dict[calculation_metadata.iri],
+                                 multi_input.get_calculation_input(calculation_metadata))
+
+    complete_message = 'Completed raster calculations'
+    logger.info(complete_message)
+
+    return complete_message
+
+
+def _get_extra_columns(rdf_type: str, exposure_dataset: ExposureDataset):
+    if rdf_type in [constants.AREA_WEIGHTED_SUM, constants.RASTER_AREA]:
+        return f", r.{exposure_dataset.area_column} AS area"
+    return ''
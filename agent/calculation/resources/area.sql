@@ -1,6 +1,6 @@
 WITH buffer_circle AS (
     SELECT ST_Buffer(
-        ST_GeomFromText(%(GEOMETRY_PLACEHOLDER)s, 3857),
+        ST_GeomFromWKB(%(GEOMETRY_PLACEHOLDER)s, 3857),
         %(DISTANCE_PLACEHOLDER)s  -- buffer radius in meters
     ) AS geom
 )
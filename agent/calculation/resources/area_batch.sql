@@ -0,0 +1,16 @@
+WITH buffer_circle AS (
+    SELECT s.subject, ST_Buffer(
+        s.geom,
+        %(DISTANCE_PLACEHOLDER)s  -- buffer radius in meters
+    ) AS geom
+    FROM {SUBJECT_TABLE} s
+)
+
+SELECT b.subject, COALESCE(SUM(ST_Area(ST_Intersection(t.wkb_geometry, b.geom))), 0) AS area
+FROM buffer_circle b
+LEFT JOIN LATERAL (
+    SELECT wkb_geometry
+    FROM {TEMP_TABLE}
+    WHERE ST_Intersects(wkb_geometry, b.geom)
+) t ON TRUE
+GROUP BY b.subject;
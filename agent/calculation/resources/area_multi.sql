@@ -0,0 +1,22 @@
+WITH buffer_circle AS (
+    SELECT s.subject, d.distance, ST_Buffer(
+        s.geom,
+        d.distance  -- buffer radius in meters
+    ) AS geom
+    FROM {SUBJECT_TABLE} s
+    CROSS JOIN unnest(%(DISTANCES_PLACEHOLDER)s::double precision[]) AS d(distance)
+),
+candidate AS (
+    -- features are searched once with the largest buffer, smaller buffers are nested inside it
+    SELECT b.subject, t.wkb_geometry, t.filter_index
+    FROM buffer_circle b
+    JOIN {TEMP_TABLE} t
+    ON ST_Intersects(t.wkb_geometry, b.geom)
+    WHERE b.distance = %(MAX_DISTANCE_PLACEHOLDER)s
+)
+
+SELECT b.subject, b.distance, c.filter_index, SUM(ST_Area(ST_Intersection(c.wkb_geometry, b.geom))) AS area
+FROM buffer_circle b
+JOIN candidate c
+ON c.subject = b.subject AND ST_Intersects(c.wkb_geometry, b.geom)
+GROUP BY b.subject, b.distance, c.filter_index;
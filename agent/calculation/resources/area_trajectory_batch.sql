@@ -0,0 +1,25 @@
+-- candidate features are found per segment, the area is intersected with the buffer of the whole trip
+WITH trip_segment AS (
+    SELECT s.subject, {SEGMENT_EXPRESSION} AS geom
+    FROM {SUBJECT_TABLE} s
+),
+buffer_circle AS (
+    SELECT g.subject, ST_Union(ST_Buffer(
+        g.geom,
+        %(DISTANCE_PLACEHOLDER)s  -- buffer radius in meters
+    )) AS geom
+    FROM trip_segment g
+    GROUP BY g.subject
+),
+candidate AS (
+    SELECT DISTINCT ON (g.subject, t.ctid) g.subject, t.wkb_geometry
+    FROM trip_segment g
+    JOIN {TEMP_TABLE} t
+    ON ST_DWithin(t.wkb_geometry, g.geom, %(DISTANCE_PLACEHOLDER)s)
+)
+
+SELECT b.subject, COALESCE(SUM(ST_Area(ST_Intersection(c.wkb_geometry, b.geom))), 0) AS exposure_result
+FROM buffer_circle b
+LEFT JOIN candidate c
+ON c.subject = b.subject AND ST_Intersects(c.wkb_geometry, b.geom)
+GROUP BY b.subject;
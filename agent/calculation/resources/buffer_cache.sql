@@ -0,0 +1,9 @@
+CREATE TABLE IF NOT EXISTS buffer_cache (
+    geometry_hash TEXT,
+    distance DOUBLE PRECISION,
+    crs TEXT, -- CRS the buffer is computed in
+    quad_segs INTEGER, -- segments per quarter circle
+    buffer BYTEA, -- WKB in EPSG:4326
+    created_at TIMESTAMPTZ DEFAULT now(),
+    PRIMARY KEY (geometry_hash, distance, crs, quad_segs)
+);
@@ -0,0 +1,9 @@
+SELECT s.subject, COUNT(t.wkb_geometry) AS intersection_count
+FROM {SUBJECT_TABLE} s
+LEFT JOIN {TEMP_TABLE} t
+ON ST_DWithin(
+    t.wkb_geometry,
+    s.geom,
+    %(DISTANCE_PLACEHOLDER)s
+)
+GROUP BY s.subject;
@@ -0,0 +1,17 @@
+-- features are searched once at the largest distance,
+-- then each subject-feature pair is counted for every distance band it falls into
+WITH hits AS (
+    SELECT s.subject, t.filter_index, ST_Distance(t.wkb_geometry, s.geom) AS feature_distance
+    FROM {SUBJECT_TABLE} s
+    JOIN {TEMP_TABLE} t
+    ON ST_DWithin(
+        t.wkb_geometry,
+        s.geom,
+        %(MAX_DISTANCE_PLACEHOLDER)s
+    )
+)
+SELECT h.subject, d.distance, h.filter_index, COUNT(*) AS intersection_count
+FROM hits h
+JOIN unnest(%(DISTANCES_PLACEHOLDER)s::double precision[]) AS d(distance)
+ON h.feature_distance <= d.distance
+GROUP BY h.subject, d.distance, h.filter_index;
@@ -2,6 +2,6 @@ SELECT COUNT(*) AS exposure_result
 FROM {TEMP_TABLE}
 WHERE ST_DWithin(
     {TEMP_TABLE}.wkb_geometry,
-    ST_GeomFromText(%(GEOMETRY_PLACEHOLDER)s),
+    ST_GeomFromWKB(%(GEOMETRY_PLACEHOLDER)s, %(SRID_PLACEHOLDER)s),
     %(DISTANCE_PLACEHOLDER)s
 );
@@ -0,0 +1,17 @@
+-- trips may be split into segments so that the spatial index only returns features near each part,
+-- a feature close to several segments of a trip is counted once
+WITH trip_segment AS (
+    SELECT s.subject, {SEGMENT_EXPRESSION} AS geom
+    FROM {SUBJECT_TABLE} s
+)
+
+SELECT s.subject, COUNT(DISTINCT t.ctid) AS exposure_result
+FROM {SUBJECT_TABLE} s
+LEFT JOIN trip_segment g ON g.subject = s.subject
+LEFT JOIN {TEMP_TABLE} t
+ON ST_DWithin(
+    t.wkb_geometry,
+    g.geom,
+    %(DISTANCE_PLACEHOLDER)s
+)
+GROUP BY s.subject;
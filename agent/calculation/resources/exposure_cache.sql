@@ -0,0 +1,10 @@
+CREATE TABLE IF NOT EXISTS exposure_cache (
+    cache_table TEXT PRIMARY KEY,
+    dataset_table TEXT,
+    geometry_column TEXT,
+    srid INTEGER,
+    dataset_filter TEXT,
+    source_fingerprint TEXT,
+    row_count BIGINT, -- rows copied, an UNLOGGED table without rows after a crash is rebuilt
+    created_at TIMESTAMPTZ DEFAULT now()
+);
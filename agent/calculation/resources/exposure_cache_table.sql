@@ -0,0 +1,11 @@
+CREATE UNLOGGED TABLE {CACHE_TABLE} AS
+SELECT ST_Transform({GEOMETRY_COLUMN}, {SRID}) AS wkb_geometry,{EXTRA_COLUMNS}
+    {FILTER_INDEX} AS filter_index -- position of the matching dataset filter
+FROM "{EXPOSURE_DATASET}"
+{DATASET_FILTERS};
+
+CREATE INDEX {CACHE_TABLE}_geom_gix
+ON {CACHE_TABLE}
+USING GIST (wkb_geometry);
+
+ANALYZE {CACHE_TABLE};
@@ -0,0 +1,11 @@
+WITH clipped_raster AS (
+    SELECT b.subject, ST_Clip(r.{GEOMETRY_COLUMN}, b.geom) AS clipped{EXTRA_COLUMNS}
+    FROM {SUBJECT_TABLE} b
+    JOIN "{EXPOSURE_DATASET}" r
+    ON ST_Intersects(b.geom, r.{GEOMETRY_COLUMN})
+    {DATASET_FILTERS}
+)
+SELECT b.subject, COALESCE(SUM({AGGREGATE}), 0) AS result
+FROM {SUBJECT_TABLE} b
+LEFT JOIN clipped_raster c ON c.subject = b.subject
+GROUP BY b.subject
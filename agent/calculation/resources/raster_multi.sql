@@ -0,0 +1,12 @@
+WITH clipped_raster AS (
+    -- buffers (EPSG:4326) of one distance, tiles of all dataset filters are read in the same scan, labelled by the matching filter
+    SELECT s.subject, {FILTER_INDEX} AS filter_index,
+        ST_Clip(r.{GEOMETRY_COLUMN}, s.geom) AS clipped{EXTRA_COLUMNS}
+    FROM {SUBJECT_TABLE} s
+    JOIN "{EXPOSURE_DATASET}" r
+    ON ST_Intersects(s.geom, r.{GEOMETRY_COLUMN})
+    AND ({DATASET_FILTERS})
+)
+SELECT c.subject, c.filter_index, COALESCE(SUM({AGGREGATE}), 0) AS result
+FROM clipped_raster c
+GROUP BY c.subject, c.filter_index
@@ -0,0 +1,6 @@
+-- read only, changes when rows are inserted, updated or deleted (number of rows and sum of the ids of the transactions
+-- that wrote them), when the table is rewritten (relfilenode) or dropped and created again (oid), scans the table once
+SELECT concat_ws(':', c.oid, c.relfilenode, s.row_count, s.xmin_sum) AS fingerprint
+FROM pg_class c,
+    (SELECT count(*) AS row_count, sum(xmin::text::bigint) AS xmin_sum FROM "{EXPOSURE_DATASET}") s
+WHERE c.oid = '"{EXPOSURE_DATASET}"'::regclass;
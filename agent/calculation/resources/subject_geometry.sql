@@ -0,0 +1,10 @@
+CREATE TABLE IF NOT EXISTS subject_geometry (
+    iri TEXT PRIMARY KEY,
+    geom geometry, -- EPSG:4326
+    source_fingerprint TEXT, -- md5 of the WKT from the knowledge graph
+    fetched_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS subject_geometry_geom_gix
+ON subject_geometry
+USING GIST (geom);
@@ -0,0 +1,4 @@
+CREATE TEMP TABLE IF NOT EXISTS {SUBJECT_TABLE} (
+    subject TEXT,
+    geom geometry
+);
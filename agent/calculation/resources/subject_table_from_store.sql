@@ -0,0 +1,4 @@
+INSERT INTO {SUBJECT_TABLE} (subject, geom)
+SELECT g.iri, ST_Transform(g.geom, %(SRID_PLACEHOLDER)s)
+FROM subject_geometry g
+WHERE g.iri = ANY(%(SUBJECT_PLACEHOLDER)s);
@@ -1,8 +1,11 @@
 CREATE TEMP TABLE {TEMP_TABLE} AS
 -- AEQD requires geometry to be converted to 4326 first
 SELECT {SELECT_CLAUSE}
-FROM "{EXPOSURE_DATASET}";
+FROM "{EXPOSURE_DATASET}"
+-- only features around the trajectory, the extent is transformed to the SRID of the dataset so that its spatial index is used
+WHERE {GEOMETRY_COLUMN} && ST_Transform(ST_GeomFromWKB(%(EXTENT_PLACEHOLDER)s, 4326),
+    (SELECT ST_SRID({GEOMETRY_COLUMN}) FROM "{EXPOSURE_DATASET}" LIMIT 1));
 
 CREATE INDEX {TEMP_TABLE}_geom_gix
 ON {TEMP_TABLE}
-USING GIST (wkb_geometry);
\ No newline at end of file
+USING GIST (wkb_geometry);
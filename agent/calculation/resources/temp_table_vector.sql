@@ -1,8 +1,12 @@
 CREATE TEMP TABLE {TEMP_TABLE} AS
-SELECT ST_Transform({GEOMETRY_COLUMN}, 3857) AS wkb_geometry
-FROM {EXPOSURE_DATASET}
-{DATASET_FILTERS};
+SELECT ST_Transform({GEOMETRY_COLUMN}, 3857) AS wkb_geometry,
+    {FILTER_INDEX} AS filter_index -- position of the matching dataset filter
+FROM "{EXPOSURE_DATASET}"
+-- only features around the subjects, the extent is transformed to the SRID of the dataset so that its spatial index is used
+WHERE {GEOMETRY_COLUMN} && ST_Transform(ST_GeomFromWKB(%(EXTENT_PLACEHOLDER)s, 4326),
+    (SELECT ST_SRID({GEOMETRY_COLUMN}) FROM "{EXPOSURE_DATASET}" LIMIT 1))
+AND ({DATASET_FILTERS});
 
 CREATE INDEX {TEMP_TABLE}_geom_gix
 ON {TEMP_TABLE}
-USING GIST (wkb_geometry);
\ No newline at end of file
+USING GIST (wkb_geometry);
@@ -0,0 +1,4 @@
+-- table, column and time series of each data IRI in the lookup table of the TimeSeriesClient
+SELECT "dataIRI", "tableName", "columnName", "timeseriesIRI"
+FROM "dbTable"
+WHERE "dataIRI" = ANY(%(DATA_IRI_PLACEHOLDER)s);
@@ -0,0 +1,8 @@
+-- time as microseconds since the epoch, read into a datetime64 array
+SELECT (EXTRACT(EPOCH FROM "time") * 1000000)::bigint AS time_us, ST_AsBinary(ST_Transform("{GEOMETRY_COLUMN}", 4326)) AS wkb{TRIP_CLAUSE}
+FROM "{TIME_SERIES_TABLE}"
+-- tables can hold several time series
+WHERE "time_series_iri" = %(TIME_SERIES_IRI_PLACEHOLDER)s
+AND "{GEOMETRY_COLUMN}" IS NOT NULL{TRIP_FILTER}
+{TIME_FILTER}
+ORDER BY "time";
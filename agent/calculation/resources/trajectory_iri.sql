@@ -1,7 +1,7 @@
-SELECT iri, ST_AsText(wkb_geometry) AS wkt
+SELECT iri, ST_AsBinary(wkb_geometry) AS wkb
 FROM {TEMP_TABLE}
 WHERE ST_DWithin(
     {TEMP_TABLE}.wkb_geometry,
-    ST_GeomFromText(%(GEOMETRY_PLACEHOLDER)s),
+    ST_GeomFromWKB(%(GEOMETRY_PLACEHOLDER)s, %(SRID_PLACEHOLDER)s),
     %(DISTANCE_PLACEHOLDER)s
 )
@@ -0,0 +1,14 @@
+WITH trip_segment AS (
+    SELECT s.subject, {SEGMENT_EXPRESSION} AS geom
+    FROM {SUBJECT_TABLE} s
+)
+
+-- features near several segments of a trip are returned once
+SELECT DISTINCT ON (g.subject, t.ctid) g.subject, t.iri, ST_AsBinary(t.wkb_geometry) AS wkb
+FROM trip_segment g
+JOIN {TEMP_TABLE} t
+ON ST_DWithin(
+    t.wkb_geometry,
+    g.geom,
+    %(DISTANCE_PLACEHOLDER)s
+);
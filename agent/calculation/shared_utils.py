@@ -1,18 +1,20 @@
 # functions that are shared between calculation types
 from agent.calculation.calculation_input import CalculationInput
-from shapely import wkt
-from shapely.ops import transform
-from pyproj import Transformer
+from agent.calculation.buffer_cache import get_buffers
+from agent.calculation.geometry_array import BUFFER_QUAD_SEGS, buffer_geometries, to_wkb_params, transform_geometries
+from agent.calculation.subject_store import get_subject_geometries
+from agent.calculation.spatial_order import sort_by_hilbert_curve
+from agent.objects.exposure_dataset import ExposureDataset
+import shapely
+from shapely.geometry import Polygon, box
 from agent.utils import constants
 from agent.utils.stack_configs import ONTOP_CLIENT
 from twa import agentlogging
-import re
 from agent.utils.postgis_client import postgis_client
 from psycopg2.extras import execute_values
 from agent.utils.stack_gateway import stack_clients_view
 from pathlib import Path
 from agent.utils.constants import METRE_SQUARED, EXPOSURE_RESULT
-import json
 import time
 
 logger = agentlogging.get_logger('dev')
@@ -82,8 +84,7 @@ def _upload_ontop_mapping():
     query = f"SELECT * WHERE {{?r a <{EXPOSURE_RESULT}>}} LIMIT 1"
 
     # currently fixed to the default ontop container
-    query_result = json.loads(
-        kg_client.ontop_client.executeQuery(query).toString())
+    query_result = kg_client.query(query, endpoint='ontop')
 
     if not query_result:
         logger.info("Updating Ontop mapping...")
@@ -103,107 +104,136 @@ def _upload_ontop_mapping():
         time.sleep(5)
 
 
-def get_iri_to_point_dict(subject):
-    # returns points in EPSG:3857, to be used for ST_DWithin in queries
-    from agent.utils.kg_client import kg_client
-    if not isinstance(subject, list):
-        subject = [subject]
-
-    iri_to_point_dict = {}
-    transformer = Transformer.from_crs(
-        "EPSG:4326", "EPSG:3857", always_xy=True)
-
-    query_template = """
-    SELECT ?subject ?wkt
-    WHERE {{
-        VALUES ?subject {{{values}}}.
-        ?subject <http://www.opengis.net/ont/geosparql#asWKT> ?wkt.
-    }}
+def create_vector_temp_table(cur, exposure_dataset: ExposureDataset, dataset_filters: list[dict], extent_wkb):
+    """
+    Creates a temp table of the exposure dataset projected to EPSG:3857 and returns its name,
+    rows inside extent_wkb (EPSG:4326) matching any of the dataset filters are kept and labelled with filter_index
     """
+    with open("agent/calculation/resources/temp_table_vector.sql", "r") as f:
+        temp_table_sql = f.read()
 
-    logger.info(
-        'Querying geometries of subjects, number of subjects: ' + str(len(subject)))
+    # handle dataset filters
+    filter_index, filter_condition, params = get_dataset_filter_sql(
+        dataset_filters)
+    params['EXTENT_PLACEHOLDER'] = extent_wkb
 
-    query_list = []
-    # submit queries in batches to avoid crashing ontop
-    for chunk in _chunk_list(subject):
-        values = " ".join(f"<{s}>" for s in chunk)
-        query = query_template.format(values=values)
-        query_list.append(query)
+    temp_table = 'temp_table'
 
-    for query in query_list:
-        query_result = json.loads(
-            kg_client.remote_store_client.executeQuery(query).toString())
+    if exposure_dataset.geometry_column is not None:
+        geometry_column = exposure_dataset.geometry_column
+    else:
+        geometry_column = constants.VECTOR_GEOMETRY_COLUMN
 
-        for row in query_result:
-            sub = row['subject']
-            wkt_literal = row['wkt']
+    temp_table_sql = temp_table_sql.format(
+        TEMP_TABLE=temp_table, EXPOSURE_DATASET=exposure_dataset.table_name, GEOMETRY_COLUMN=geometry_column,
+        FILTER_INDEX=filter_index, DATASET_FILTERS=filter_condition)
+    cur.execute(temp_table_sql, params)
 
-            # strip RDF literal IRI, i.e. ^^<http://www.opengis.net/ont/geosparql#wktLiteral>
-            match = re.match(r'^"(.+)"\^\^<.+>$', wkt_literal)
-            if match:
-                geom = wkt.loads(match.group(1))
-            else:
-                geom = wkt.loads(wkt_literal)
+    return temp_table
 
-            projected_geom = transform(transformer.transform, geom)
-            iri_to_point_dict[sub] = projected_geom
 
-    return iri_to_point_dict
+def get_extent_wkb(geoms: list, distance: float, crs: str):
+    """
+    Returns the bounding box of geoms expanded by distance as WKB (bytea parameter) in EPSG:4326,
+    geoms are given in crs, distance is in the units of crs
+    """
+    if len(geoms) == 0:
+        return to_wkb_params([Polygon()])[0]
 
+    minx, miny, maxx, maxy = shapely.total_bounds(geoms)
+    extent = box(minx - distance, miny - distance,
+                 maxx + distance, maxy + distance)
 
-def get_iri_to_buffer_dict(subject, distance: float):
-    # returns buffers in 4326
-    from agent.utils.kg_client import kg_client
+    # densify the edges so that the box still covers the region after reprojection
+    segment_length = max(maxx - minx, maxy - miny) + 2 * distance
+    if segment_length > 0:
+        extent = shapely.segmentize(extent, segment_length / 16)
 
-    iri_to_buffer_dict = {}
-    transformer = Transformer.from_crs(
-        "EPSG:4326", "EPSG:3857", always_xy=True)
+    return to_wkb_params(transform_geometries([extent], crs, "EPSG:4326"))[0]
 
-    transformer_back = Transformer.from_crs(
-        "EPSG:3857", "EPSG:4326", always_xy=True)
 
-    query_template = """
-    SELECT ?subject ?wkt
-    WHERE {{
-        VALUES ?subject {{{values}}}.
-        ?subject <http://www.opengis.net/ont/geosparql#asWKT> ?wkt.
-    }}
+def get_dataset_filter_sql(dataset_filters: list[dict], alias: str = ''):
+    """
+    SQL to evaluate several dataset filters in one scan, returns
+    1) an expression giving the position of the matching filter in dataset_filters
+    2) a condition matching rows of any filter
+    3) parameters for both
+    values are compared by PostgreSQL as in "WHERE year = %(year)s"
     """
+    params = {}
+    conditions = []
+    for i, dataset_filter in enumerate(dataset_filters):
+        clauses = []
+        for key, value in dataset_filter.items():
+            params[f"filter_{i}_{key}"] = value
+            clauses.append(f"{alias}{key} = %(filter_{i}_{key})s")
+        conditions.append(" AND ".join(clauses))
 
-    logger.info(
-        'Querying geometries of subjects, number of subjects: ' + str(len(subject)))
+    if not params:
+        return '0', 'TRUE', params
 
-    query_list = []
-    # submit queries in batches to avoid crashing ontop
-    for chunk in _chunk_list(subject):
-        values = " ".join(f"<{s}>" for s in chunk)
-        query = query_template.format(values=values)
-        query_list.append(query)
+    when_clauses = " ".join(
+        f"WHEN {c} THEN {i}" for i, c in enumerate(conditions))
+    filter_index = f"CASE {when_clauses} END"
+    filter_condition = " OR ".join(f"({c})" for c in conditions)
 
-    for query in query_list:
-        query_result = json.loads(
-            kg_client.remote_store_client.executeQuery(query).toString())
+    return filter_index, filter_condition, params
 
-        for row in query_result:
-            sub = row['subject']
-            wkt_literal = row['wkt']
 
-            # strip RDF literal IRI, i.e. ^^<http://www.opengis.net/ont/geosparql#wktLiteral>
-            match = re.match(r'^"(.+)"\^\^<.+>$', wkt_literal)
-            if match:
-                geom = wkt.loads(match.group(1))
-            else:
-                geom = wkt.loads(wkt_literal)
+def get_iri_to_point_dict(subject):
+    # returns points in EPSG:3857, to be used for ST_DWithin in queries
+    # the geometries are still read here for deduplication, ordering and the extent of the exposure temp table,
+    # batched calculations then join subject_geometry instead of sending them back (execute_batch with from_store)
+    iri_to_geom_dict = get_subject_geometries(subject)
+
+    # all geometries are projected in one call
+    iri_to_point_dict = dict(zip(iri_to_geom_dict.keys(), transform_geometries(
+        list(iri_to_geom_dict.values()), "EPSG:4326", "EPSG:3857")))
+
+    # nearby subjects are queried one after another, also within chunks
+    return sort_by_hilbert_curve(iri_to_point_dict)
+
+
+def get_iri_to_buffer_dict(subject, distance: float):
+    # returns buffers in 4326
+    iri_to_geom_dict = get_subject_geometries(subject)
+
+    def compute_buffers(geoms):
+        return buffer_geometries(geoms, distance, "EPSG:3857", "EPSG:4326", BUFFER_QUAD_SEGS)
+
+    # subjects with identical geometries share the same buffer, buffers are cached between calculations
+    wkb_to_buffer = get_buffers({geom.wkb: geom for geom in iri_to_geom_dict.values()},
+                                distance, "EPSG:3857", BUFFER_QUAD_SEGS, compute_buffers)
+    iri_to_buffer_dict = {iri: wkb_to_buffer[geom.wkb]
+                          for iri, geom in iri_to_geom_dict.items()}
+
+    # nearby subjects are queried one after another, also within chunks
+    return sort_by_hilbert_curve(iri_to_buffer_dict)
+
+
+def group_by_geometry(iri_to_geom_dict: dict):
+    """
+    Subjects with identical geometries (same WKB) only need to be calculated once, returns
+    1) a dictionary of representative IRI to geometry, one entry per unique geometry
+    2) a dictionary of representative IRI to the IRIs sharing its geometry
+    """
+    wkb_to_representative = {}
+    representative_to_iris = {}
+    for iri, geom in iri_to_geom_dict.items():
+        representative = wkb_to_representative.setdefault(geom.wkb, iri)
+        representative_to_iris.setdefault(representative, []).append(iri)
+
+    representative_to_geom_dict = {
+        representative: iri_to_geom_dict[representative] for representative in representative_to_iris}
 
-            projected_geom = transform(transformer.transform, geom)
-            buffered_geom = projected_geom.buffer(distance)
-            iri_to_buffer_dict[sub] = transform(
-                transformer_back.transform, buffered_geom)
+    if iri_to_geom_dict:
+        logger.info(f'{len(representative_to_geom_dict)} unique geometries for {len(iri_to_geom_dict)} subjects, '
+                    f'dedup ratio: {len(iri_to_geom_dict) / len(representative_to_geom_dict):.2f}')
 
-    return iri_to_buffer_dict
+    return representative_to_geom_dict, representative_to_iris
 
 
-def _chunk_list(values, chunk_size=10000):
-    for i in range(0, len(values), chunk_size):
-        yield values[i:i + chunk_size]
+def fan_out(representative_to_value_dict: dict, representative_to_iris: dict):
+    # copies the result of each unique geometry to every IRI sharing it
+    return {iri: value for representative, value in representative_to_value_dict.items()
+            for iri in representative_to_iris[representative]}
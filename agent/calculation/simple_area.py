@@ -1,11 +1,14 @@
-from agent.calculation.calculation_input import CalculationInput
-from agent.calculation.shared_utils import get_iri_to_point_dict, instantiate_result_ontop
-from agent.objects.exposure_dataset import get_exposure_dataset
-from agent.utils import constants
+from agent.calculation.batch_utils import SUBJECT_TABLE, execute_batch
+from agent.calculation.calculation_input import CalculationInput, MultiCalculationInput
+from agent.calculation.exposure_cache import get_shared_exposure_table, get_vector_exposure_table
+from agent.calculation.geometry_array import to_wkb_params
+from agent.calculation.prepared_statement import execute_per_subject
+from agent.calculation.shared_utils import fan_out, group_by_geometry, get_iri_to_point_dict, instantiate_result_ontop
+from agent.objects.calculation_metadata import CalculationMetadata
+from agent.objects.exposure_dataset import ExposureDataset, get_exposure_dataset
+from agent.utils.env_configs import BATCH_CALCULATION
 from agent.utils.postgis_client import postgis_client
 from twa import agentlogging
-from tqdm import tqdm
-import sys
 from agent.objects.exposure_value import ExposureValue
 from agent.utils.constants import METRE_SQUARED
 
@@ -14,61 +17,131 @@ logger = agentlogging.get_logger('dev')
 
 def simple_area(calculation_input: CalculationInput):
     iri_to_point_dict = get_iri_to_point_dict(calculation_input.subject)
-    subject_to_result_dict = {}
+    # identical geometries are calculated once
+    iri_to_point_dict, representative_to_iris = group_by_geometry(iri_to_point_dict)
 
     exposure_dataset = get_exposure_dataset(calculation_input.exposure)
 
-    with open("agent/calculation/resources/temp_table_vector.sql", "r") as f:
-        temp_table_sql = f.read()
+    logger.info('Submitting SQL queries for calculations')
+    # a list of subjects is answered chunk by chunk, a single subject keeps the per-subject query
+    if BATCH_CALCULATION and isinstance(calculation_input.subject, list):
+        subject_to_result_dict = _area_batch(
+            iri_to_point_dict, exposure_dataset, calculation_input.calculation_metadata)
+    else:
+        with postgis_client.connect() as conn:
+            with conn.cursor() as cur:
+                # projected copy of the exposure dataset, cached between requests or a temp table
+                exposure_table = get_vector_exposure_table(
+                    cur, exposure_dataset, [calculation_input.calculation_metadata.dataset_filter],
+                    iri_to_point_dict, calculation_input.calculation_metadata.distance)
+                subject_to_result_dict = _area_per_subject(
+                    cur, iri_to_point_dict, exposure_table, calculation_input.calculation_metadata.distance)
 
-    with open("agent/calculation/resources/area.sql", "r") as f:
-        area_sql = f.read()
+    logger.info('Instantiating results')
+    instantiate_result_ontop(fan_out(subject_to_result_dict, representative_to_iris), calculation_input)
 
-    # handle dataset filters
-    where_clause = " AND ".join(
-        f"{k} = %({k})s" for k in calculation_input.calculation_metadata.dataset_filter)
-    if where_clause:
-        where_clause = f"WHERE {where_clause}"
+    complete_message = 'Completed calculation for simple area'
+    logger.info(complete_message)
 
-    params = {}
-    for key, value in calculation_input.calculation_metadata.dataset_filter.items():
-        params[key] = value
+    return complete_message
 
-    logger.info('Submitting SQL queries for calculations')
-    with postgis_client.connect() as conn:
-        with conn.cursor() as cur:
-            # create temp table for efficiency
-            temp_table = 'temp_table'
 
-            if exposure_dataset.geometry_column is not None:
-                geometry_column = exposure_dataset.geometry_column
-            else:
-                geometry_column = constants.VECTOR_GEOMETRY_COLUMN
-
-            temp_table_sql = temp_table_sql.format(
-                TEMP_TABLE=temp_table, EXPOSURE_DATASET=exposure_dataset.table_name, GEOMETRY_COLUMN=geometry_column, DATASET_FILTERS=where_clause)
-            cur.execute(temp_table_sql, params)
-
-            area_sql = area_sql.format(TEMP_TABLE=temp_table)
-            for iri, point in tqdm(iri_to_point_dict.items(), mininterval=60, ncols=80, file=sys.stdout):
-                replacements = {
-                    'GEOMETRY_PLACEHOLDER': point.wkt,
-                    'DISTANCE_PLACEHOLDER': calculation_input.calculation_metadata.distance
-                }
-                cur.execute(area_sql, replacements)
-                if cur.description:
-                    query_result = cur.fetchall()
-                    if query_result[0][0] is None:
-                        subject_to_result_dict[iri] = ExposureValue(
-                            value=0, unit=METRE_SQUARED)
-                    else:
-                        subject_to_result_dict[iri] = ExposureValue(
-                            value=query_result[0][0], unit=METRE_SQUARED)
+def simple_area_multi(multi_input: MultiCalculationInput):
+    """
+    Area for several distances and dataset filters in a single pass
+    """
+    iri_to_point_dict = get_iri_to_point_dict(multi_input.subject)
+    # identical geometries are calculated once
+    iri_to_point_dict, representative_to_iris = group_by_geometry(iri_to_point_dict)
+
+    exposure_dataset = get_exposure_dataset(multi_input.exposure)
+
+    with open("agent/calculation/resources/area_multi.sql", "r") as f:
+        area_multi_sql = f.read()
+
+    # combinations without any intersection do not appear in the query result
+    calculation_to_result_dict = {m.iri: {iri: ExposureValue(value=0, unit=METRE_SQUARED) for iri in iri_to_point_dict}
+                                  for m in multi_input.calculation_metadata_list}
+
+    # the persistent cache is resolved once and shared by all connections
+    shared_table = get_shared_exposure_table(
+        exposure_dataset, multi_input.dataset_filters)
+
+    def prepare_sql(cur):
+        # runs on every connection of the pool, temp tables are not shared between connections
+        exposure_table = shared_table
+        if exposure_table is None:
+            exposure_table = get_vector_exposure_table(
+                cur, exposure_dataset, multi_input.dataset_filters, iri_to_point_dict, multi_input.distances[-1])
+        return area_multi_sql.format(TEMP_TABLE=exposure_table, SUBJECT_TABLE=SUBJECT_TABLE)
+
+    params = {'DISTANCES_PLACEHOLDER': multi_input.distances,
+              'MAX_DISTANCE_PLACEHOLDER': multi_input.distances[-1]}
+
+    logger.info('Submitting SQL queries for calculations')
+    for iri, distance, filter_index, area in execute_batch(prepare_sql, iri_to_point_dict, 3857, params, from_store=True):
+        calculation_metadata = multi_input.get_calculation_metadata(
+            distance, filter_index)
+        if calculation_metadata is not None:
+            calculation_to_result_dict[calculation_metadata.iri][iri] = ExposureValue(
+                value=area, unit=METRE_SQUARED)
 
     logger.info('Instantiating results')
-    instantiate_result_ontop(subject_to_result_dict, calculation_input)
+    for calculation_metadata in multi_input.calculation_metadata_list:
+        instantiate_result_ontop(fan_out(calculation_to_result_dict[calculation_metadata.iri], representative_to_iris),
+                                 multi_input.get_calculation_input(calculation_metadata))
 
-    complete_message = 'Completed calculation for simple area'
+    complete_message = 'Completed calculations for simple area'
     logger.info(complete_message)
 
     return complete_message
+
+
+def _area_per_subject(cur, iri_to_point_dict: dict, exposure_table: str, distance: float):
+    with open("agent/calculation/resources/area.sql", "r") as f:
+        area_sql = f.read()
+
+    area_sql = area_sql.format(TEMP_TABLE=exposure_table)
+
+    wkb_params = to_wkb_params(list(iri_to_point_dict.values()))
+    key_to_params = {iri: {'GEOMETRY_PLACEHOLDER': wkb, 'DISTANCE_PLACEHOLDER': distance}
+                     for iri, wkb in zip(iri_to_point_dict, wkb_params)}
+
+    subject_to_result_dict = {}
+    for iri, query_result in execute_per_subject(cur, 'area', area_sql, key_to_params).items():
+        if query_result:
+            if query_result[0][0] is None:
+                subject_to_result_dict[iri] = ExposureValue(
+                    value=0, unit=METRE_SQUARED)
+            else:
+                subject_to_result_dict[iri] = ExposureValue(
+                    value=query_result[0][0], unit=METRE_SQUARED)
+
+    return subject_to_result_dict
+
+
+def _area_batch(iri_to_point_dict: dict, exposure_dataset: ExposureDataset, calculation_metadata: CalculationMetadata):
+    # buffers of a chunk are computed once in SQL and joined to the exposure features with LATERAL,
+    # subjects without intersecting features get an area of 0 as in the per-subject query
+    with open("agent/calculation/resources/area_batch.sql", "r") as f:
+        area_batch_sql = f.read()
+
+    # the persistent cache is resolved once and shared by all connections
+    shared_table = get_shared_exposure_table(
+        exposure_dataset, [calculation_metadata.dataset_filter])
+
+    def prepare_sql(cur):
+        # runs on every connection of the pool, temp tables are not shared between connections
+        exposure_table = shared_table
+        if exposure_table is None:
+            exposure_table = get_vector_exposure_table(
+                cur, exposure_dataset, [calculation_metadata.dataset_filter], iri_to_point_dict, calculation_metadata.distance)
+        return area_batch_sql.format(TEMP_TABLE=exposure_table, SUBJECT_TABLE=SUBJECT_TABLE)
+
+    subject_to_result_dict = {}
+    for iri, area in execute_batch(prepare_sql, iri_to_point_dict, 3857, {'DISTANCE_PLACEHOLDER': calculation_metadata.distance},
+                                   from_store=True):
+        subject_to_result_dict[iri] = ExposureValue(
+            value=area, unit=METRE_SQUARED)
+
+    return subject_to_result_dict
@@ -0,0 +1,61 @@
+# orders subjects along a Hilbert curve so that consecutive queries touch nearby index pages and raster tiles
+import numpy as np
+import shapely
+
+HILBERT_ORDER = 16
+
+
+def sort_by_hilbert_curve(iri_to_geom_dict: dict):
+    """
+    Returns a new dictionary with the same items, ordered by the Hilbert index of the
+    centroid of each geometry within the extent of all geometries
+    """
+    if len(iri_to_geom_dict) < 2:
+        return iri_to_geom_dict
+
+    iris = list(iri_to_geom_dict.keys())
+    centroids = shapely.centroid(np.array(list(iri_to_geom_dict.values())))
+    x = shapely.get_x(centroids)
+    y = shapely.get_y(centroids)
+
+    # scale the centroids to integer cells of a 2^HILBERT_ORDER grid
+    n = 2 ** HILBERT_ORDER
+    x = _to_grid(x, n)
+    y = _to_grid(y, n)
+
+    order = np.argsort(_hilbert_index(x, y, n), kind='stable')
+    return {iris[i]: iri_to_geom_dict[iris[i]] for i in order}
+
+
+def _to_grid(values: np.ndarray, n: int):
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return np.zeros(len(values), dtype=np.int64)
+
+    lower = values[valid].min()
+    upper = values[valid].max()
+    # empty geometries have no centroid, they are placed at the lower end
+    values = np.where(valid, values, lower)
+    if upper == lower:
+        return np.zeros(len(values), dtype=np.int64)
+    return np.minimum(((values - lower) / (upper - lower) * n).astype(np.int64), n - 1)
+
+
+def _hilbert_index(x: np.ndarray, y: np.ndarray, n: int):
+    # vectorised version of the iterative xy to d conversion
+    d = np.zeros(len(x), dtype=np.int64)
+    s = n // 2
+    while s > 0:
+        rx = ((x & s) > 0).astype(np.int64)
+        ry = ((y & s) > 0).astype(np.int64)
+        d += s * s * ((3 * rx) ^ ry)
+
+        # rotate the quadrant
+        flip = (ry == 0) & (rx == 1)
+        x = np.where(flip, n - 1 - x, x)
+        y = np.where(flip, n - 1 - y, y)
+        swap = ry == 0
+        x, y = np.where(swap, y, x), np.where(swap, x, y)
+
+        s //= 2
+    return d
@@ -0,0 +1,156 @@
+# local copy of subject geometries in PostGIS, the knowledge graph is only queried for unknown or changed subjects
+import hashlib
+import re
+import shapely
+from psycopg2.extras import execute_values
+from agent.calculation.geometry_array import from_wkb_values, to_wkb_params
+from agent.utils.env_configs import SUBJECT_GEOMETRY_TTL, SUBJECT_STORE
+from agent.utils.postgis_client import postgis_client
+from twa import agentlogging
+
+logger = agentlogging.get_logger('dev')
+
+
+def get_subject_geometries(subject: list):
+    """
+    Returns a dictionary of subject IRI to geometry (EPSG:4326), subjects without a geometry are left out.
+    Stored geometries older than SUBJECT_GEOMETRY_TTL are compared with the knowledge graph by their
+    fingerprint (md5 of the WKT), only changed and unknown geometries are queried in full
+    """
+    if not isinstance(subject, list):
+        subject = [subject]
+
+    if not SUBJECT_STORE:
+        iri_to_wkt_dict = query_subject_wkt(subject)
+        return dict(zip(iri_to_wkt_dict, shapely.from_wkt(list(iri_to_wkt_dict.values()))))
+
+    with open("agent/calculation/resources/subject_geometry.sql", "r") as f:
+        subject_geometry_sql = f.read()
+
+    iri_to_geom_dict = {}
+    with postgis_client.connect() as conn:
+        with conn.cursor() as cur:
+            # concurrent CREATE TABLE IF NOT EXISTS can fail, serialise it
+            cur.execute(
+                "SELECT pg_advisory_xact_lock(hashtext('subject_geometry'))")
+            cur.execute(subject_geometry_sql)
+
+            cur.execute("""
+                SELECT iri, ST_AsBinary(geom), source_fingerprint, fetched_at > now() - make_interval(secs => %s)
+                FROM subject_geometry
+                WHERE iri = ANY(%s)
+                """, (SUBJECT_GEOMETRY_TTL, subject))
+            rows = cur.fetchall()
+
+    fresh_rows = [row for row in rows if row[3]]
+    iri_to_geom_dict.update(
+        zip([row[0] for row in fresh_rows], from_wkb_values([row[1] for row in fresh_rows])))
+
+    # stale geometries are kept if their WKT in the knowledge graph has not changed
+    stale_rows = [row for row in rows if not row[3]]
+    unchanged_rows = []
+    if stale_rows:
+        iri_to_fingerprint = query_subject_fingerprint(
+            [row[0] for row in stale_rows])
+        unchanged_rows = [row for row in stale_rows
+                          if row[2] is not None and iri_to_fingerprint.get(row[0]) == row[2]]
+    if unchanged_rows:
+        unchanged = [row[0] for row in unchanged_rows]
+        iri_to_geom_dict.update(
+            zip(unchanged, from_wkb_values([row[1] for row in unchanged_rows])))
+        with postgis_client.connect() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE subject_geometry SET fetched_at = now()
+                    WHERE iri = ANY(%s)
+                    """, (unchanged,))
+
+    missing = [iri for iri in subject if iri not in iri_to_geom_dict]
+    logger.info(
+        f'Subject geometries: {len(fresh_rows)} from the local store, {len(unchanged_rows)} unchanged after checking the fingerprint, '
+        f'{len(missing)} from the knowledge graph')
+    if not missing:
+        return iri_to_geom_dict
+
+    iri_to_wkt_dict = query_subject_wkt(missing)
+    # WKT literals of the knowledge graph are parsed once here, PostGIS receives WKB
+    geoms = shapely.from_wkt(list(iri_to_wkt_dict.values()))
+    with postgis_client.connect() as conn:
+        with conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO subject_geometry (iri, geom, source_fingerprint, fetched_at)
+                VALUES %s
+                ON CONFLICT (iri)
+                DO UPDATE SET geom = EXCLUDED.geom,
+                              source_fingerprint = EXCLUDED.source_fingerprint,
+                              fetched_at = EXCLUDED.fetched_at
+                """, [(iri, wkb, hashlib.md5(wkt_literal.encode()).hexdigest())
+                      for (iri, wkt_literal), wkb in zip(iri_to_wkt_dict.items(), to_wkb_params(geoms))],
+                template="(%s, ST_GeomFromWKB(%s, 4326), %s, now())")
+
+    iri_to_geom_dict.update(zip(iri_to_wkt_dict, geoms))
+
+    return iri_to_geom_dict
+
+
+def query_subject_fingerprint(subject: list):
+    # returns a dictionary of subject IRI to the md5 of its WKT, computed by the endpoint so that the WKT is not transferred
+    from agent.utils.kg_client import kg_client
+
+    query_template = """
+    SELECT ?subject (MD5(STR(?wkt)) AS ?fingerprint)
+    WHERE {{
+        VALUES ?subject {{{values}}}.
+        ?subject <http://www.opengis.net/ont/geosparql#asWKT> ?wkt.
+    }}
+    """
+
+    logger.info(
+        'Querying geometry fingerprints of subjects, number of subjects: ' + str(len(subject)))
+
+    def build_query(chunk):
+        values = " ".join(f"<{s}>" for s in chunk)
+        return query_template.format(values=values)
+
+    iri_to_fingerprint = {}
+    for query_result in kg_client.query_values(subject, build_query, 'subject_fingerprint'):
+        for row in query_result:
+            iri_to_fingerprint[row['subject']] = row['fingerprint']
+
+    return iri_to_fingerprint
+
+
+def query_subject_wkt(subject: list):
+    # returns a dictionary of subject IRI to WKT from the knowledge graph
+    from agent.utils.kg_client import kg_client
+
+    query_template = """
+    SELECT ?subject ?wkt
+    WHERE {{
+        VALUES ?subject {{{values}}}.
+        ?subject <http://www.opengis.net/ont/geosparql#asWKT> ?wkt.
+    }}
+    """
+
+    logger.info(
+        'Querying geometries of subjects, number of subjects: ' + str(len(subject)))
+
+    def build_query(chunk):
+        values = " ".join(f"<{s}>" for s in chunk)
+        return query_template.format(values=values)
+
+    iri_to_wkt_dict = {}
+    # submit queries in chunks to avoid crashing ontop, the chunk size adapts to the endpoint
+    for query_result in kg_client.query_values(subject, build_query, 'subject_geometry'):
+        for row in query_result:
+            wkt_literal = row['wkt']
+
+            # strip RDF literal IRI, i.e. ^^<http://www.opengis.net/ont/geosparql#wktLiteral>
+            match = re.match(r'^"(.+)"\^\^<.+>$', wkt_literal)
+            if match:
+                wkt_literal = match.group(1)
+
+            iri_to_wkt_dict[row['subject']] = wkt_literal
+
+    return iri_to_wkt_dict
+
@@ -0,0 +1,123 @@
+# reads trajectory time series straight from the tables of the TimeSeriesClient instead of going through Ontop
+from datetime import datetime, timezone
+import numpy as np
+from agent.calculation.geometry_array import from_wkb_values
+from agent.objects.time_series import TimeSeries
+from agent.utils.postgis_client import postgis_client
+from twa import agentlogging
+
+logger = agentlogging.get_logger('dev')
+
+# rows fetched per round trip of the server-side cursor
+ITER_SIZE = 10000
+
+
+def read_trajectory(subject: str, trip: str, lowerbound, upperbound):
+    """
+    Returns a TimeSeries of the trajectory subject (points in EPSG:4326) and the trip indices if trip
+    is not None, ordered by time and within the bounds (epoch seconds or ISO 8601).
+    Returns None if the table, columns or time series cannot be resolved, e.g. the data is not stored in this database
+    """
+    from agent.utils.kg_client import kg_client
+
+    data_iri_list = [subject] if trip is None else [subject, trip]
+
+    with postgis_client.connect() as conn:
+        with conn.cursor() as cur:
+            iri_to_column_dict = _get_columns(cur, data_iri_list)
+            if iri_to_column_dict is None:
+                return None
+
+            tables = {table for table, _, _ in iri_to_column_dict.values()}
+            time_series_iris = {time_series_iri for _, _,
+                                time_series_iri in iri_to_column_dict.values()}
+            if len(tables) > 1 or len(time_series_iris) > 1:
+                logger.info(
+                    'Trajectory and trip are stored in different tables or time series')
+                return None
+            time_series_table = tables.pop()
+            time_series_iri = time_series_iris.pop()
+
+            # rows of other time series in the same table are filtered by this column
+            cur.execute("""
+                SELECT 1 FROM pg_attribute
+                WHERE attrelid = to_regclass(%s) AND attname = 'time_series_iri' AND NOT attisdropped
+                """, (f'"{time_series_table}"',))
+            if time_series_iri is None or cur.fetchone() is None:
+                logger.info(
+                    f'Time series IRI cannot be resolved in {time_series_table}')
+                return None
+
+            conditions = []
+            params = {'TIME_SERIES_IRI_PLACEHOLDER': time_series_iri}
+            if lowerbound is not None:
+                conditions.append(
+                    'AND "time" >= %(LOWERBOUND_PLACEHOLDER)s::timestamptz')
+                params['LOWERBOUND_PLACEHOLDER'] = _get_bound_param(lowerbound)
+            if upperbound is not None:
+                conditions.append(
+                    'AND "time" <= %(UPPERBOUND_PLACEHOLDER)s::timestamptz')
+                params['UPPERBOUND_PLACEHOLDER'] = _get_bound_param(upperbound)
+
+            trip_clause = ''
+            trip_filter = ''
+            if trip is not None:
+                trip_clause = f', "{iri_to_column_dict[trip][1]}" AS trip'
+                # samples without a trip value are left out like samples without a point
+                trip_filter = f'\nAND "{iri_to_column_dict[trip][1]}" IS NOT NULL'
+
+            with open("agent/calculation/resources/time_series_trajectory.sql", "r") as f:
+                trajectory_sql = f.read()
+            trajectory_sql = trajectory_sql.format(
+                GEOMETRY_COLUMN=iri_to_column_dict[subject][1], TRIP_CLAUSE=trip_clause, TRIP_FILTER=trip_filter,
+                TIME_SERIES_TABLE=time_series_table, TIME_FILTER="\n".join(conditions))
+
+        # server-side cursor, rows arrive in batches of ITER_SIZE instead of all at once
+        microsecond_list = []
+        wkb_list = []
+        trip_list = []
+        with conn.cursor(name='trajectory_reader') as cur:
+            cur.itersize = ITER_SIZE
+            cur.execute(trajectory_sql, params)
+            for row in cur:
+                microsecond_list.append(row[0])
+                wkb_list.append(row[1])
+                if trip is not None:
+                    trip_list.append(row[2])
+
+    logger.info(f'Read {len(microsecond_list)} rows from {time_series_table}')
+    time_series = TimeSeries(np.array(microsecond_list, dtype=np.int64).view('datetime64[us]'),
+                             java_time_converter=lambda time_list: kg_client.convert_input_time_for_timeseries(time_list, subject))
+    time_series.add_value(subject, from_wkb_values(wkb_list))
+    if trip is not None:
+        time_series.add_value(trip, trip_list)
+    return time_series
+
+
+def _get_columns(cur, data_iri_list: list):
+    # data IRI to (table, column, time series IRI), None if any of them is missing
+    cur.execute("SELECT to_regclass('\"dbTable\"')")
+    if cur.fetchone()[0] is None:
+        logger.info('Time series lookup table not found')
+        return None
+
+    with open("agent/calculation/resources/time_series_columns.sql", "r") as f:
+        time_series_columns_sql = f.read()
+    cur.execute(time_series_columns_sql, {
+                'DATA_IRI_PLACEHOLDER': data_iri_list})
+    iri_to_column_dict = {row[0]: (row[1], row[2], row[3])
+                          for row in cur.fetchall()}
+
+    if any(iri not in iri_to_column_dict for iri in data_iri_list):
+        logger.info('Time series columns not found for ' +
+                    ', '.join(iri for iri in data_iri_list if iri not in iri_to_column_dict))
+        return None
+    return iri_to_column_dict
+
+
+def _get_bound_param(bound):
+    # bounds are given in epoch seconds or as ISO 8601 strings, the latter are parsed by PostgreSQL
+    try:
+        return datetime.fromtimestamp(float(bound), tz=timezone.utc)
+    except (ValueError, TypeError):
+        return str(bound)
@@ -1,24 +1,32 @@
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from zoneinfo import ZoneInfo
-from agent.calculation.shared_utils import instantiate_result_ontop
+from agent.calculation.geometry_array import from_wkb_values, get_utm_srid, to_wkb_params, transform_geometries
+from agent.calculation.batch_utils import SUBJECT_TABLE, create_subject_table, load_subject_table
+from agent.calculation.exposure_cache import prepare_exposure_cache
+from agent.calculation.prepared_statement import execute_per_subject
+from agent.calculation.shared_utils import get_extent_wkb, instantiate_result_ontop
+from agent.calculation.time_series_reader import read_trajectory
 from agent.objects.business_establishment import BusinessEstablishment
 from agent.objects.exposure_dataset import ExposureDataset, get_exposure_dataset
 from agent.objects.schedule import AdHocSchedule, RegularSchedule, SchedulePeriod
 from agent.utils import constants
+from agent.utils.env_configs import BATCH_CALCULATION, TIME_SERIES_MAX_IN_FLIGHT, TRAJECTORY_ENGINE, TRAJECTORY_SEGMENT_LENGTH, \
+    TRAJECTORY_WORKERS
 from agent.utils.ts_client import TimeSeriesClient
 from agent.calculation.calculation_input import CalculationInput
-from shapely.geometry import LineString, Point
+from shapely.geometry import Point, box
+import numpy as np
 from twa import agentlogging
 from agent.utils.stack_gateway import stack_clients_view
 from agent.utils.postgis_client import postgis_client
-from agent.objects.trip import Trip
-from pyproj import Transformer, CRS
+from agent.objects.trip import Trip, build_trajectories, split_trips
 import agent.utils.constants as constants
-from shapely import wkt
-from tqdm import tqdm
-import sys
-import json
+import shapely
 from datetime import datetime, date, time, timedelta
 from psycopg2.extras import RealDictCursor
+from tqdm import tqdm
 
 logger = agentlogging.get_logger('dev')
 
@@ -30,6 +38,15 @@ rdf_type_to_sql_path = {
     constants.TRAJECTORY_TIME_FILTER_COUNT_DETAILED: "agent/calculation/resources/trajectory_iri.sql"
 }
 
+# all trips answered by one grouped query
+rdf_type_to_batch_sql_path = {
+    constants.TRAJECTORY_COUNT: "agent/calculation/resources/count_trajectory_batch.sql",
+    constants.TRAJECTORY_AREA: "agent/calculation/resources/area_trajectory_batch.sql",
+    constants.TRAJECTORY_AREA_WEIGHTED_SUM: "agent/calculation/resources/area_weighted_sum_trajectory_batch.sql",
+    constants.TRAJECTORY_TIME_FILTER_COUNT: "agent/calculation/resources/trajectory_iri_batch.sql",
+    constants.TRAJECTORY_TIME_FILTER_COUNT_DETAILED: "agent/calculation/resources/trajectory_iri_batch.sql"
+}
+
 rdf_type_to_ts_class = {
     constants.TRAJECTORY_COUNT: stack_clients_view.java.lang.Integer.TYPE,
     constants.TRAJECTORY_AREA: stack_clients_view.java.lang.Double.TYPE,
@@ -38,9 +55,22 @@ rdf_type_to_ts_class = {
     constants.TRAJECTORY_TIME_FILTER_COUNT_DETAILED: stack_clients_view.java.lang.Integer.TYPE
 }
 
+# limits the number of time series read at the same time, shared by all requests
+_time_series_semaphore = threading.BoundedSemaphore(TIME_SERIES_MAX_IN_FLIGHT)
+# concurrent CREATE TABLE IF NOT EXISTS of the result table can fail, serialise it
+_result_lock = threading.Lock()
 
-def trajectory(calculation_input: CalculationInput):
+
+def trajectory(calculation_input: CalculationInput, exposure_dataset: ExposureDataset = None, get_exposure_table=None):
+    """
+    Calculates the exposure of one trajectory, a list of subjects is passed on to trajectory_batch.
+    get_exposure_table is given by batch calculations, it returns the shared copy of the exposure
+    dataset for an SRID (the UTM zone, or EPSG:4326 as the source of the AEQD temp table)
+    """
     from agent.utils.kg_client import kg_client
+    if isinstance(calculation_input.subject, list):
+        return trajectory_batch(calculation_input)
+
     # subject must be a time series
     ts_client = TimeSeriesClient(calculation_input.subject)
     lowerbound = calculation_input.calculation_metadata.lowerbound
@@ -55,35 +85,58 @@ def trajectory(calculation_input: CalculationInput):
 
     logger.info('Querying time series')
 
-    points, trip_list, java_time_list, timestamp_list = _get_time_series_sparql(
-        calculation_input.subject, trip_iri, lowerbound, upperbound)
+    with _time_series_semaphore:
+        time_series = _get_time_series(
+            calculation_input.subject, trip_iri, lowerbound, upperbound)
 
-    if len(points) == 0:
+    if len(time_series) == 0:
         logger.info('Trajectory time series is empty')
         return None
 
+    points = time_series.get_value_list(calculation_input.subject)
+
     # create temporary centroid for AEQD projection
-    centroid = LineString(points).envelope.centroid
-    proj4text = f"+proj=aeqd +lat_0={centroid.y} +lon_0={centroid.x} +units=m +datum=WGS84 +no_defs"
+    centroid = box(*shapely.total_bounds(points)).centroid
+
+    # with the UTM engine the trajectory is projected to the UTM zone of its centroid and compared
+    # with a cached copy of the dataset in that zone, otherwise the dataset is projected to AEQD per request
+    utm_srid = None
+    if TRAJECTORY_ENGINE == 'utm':
+        utm_srid = get_utm_srid(points, centroid)
+        if utm_srid is None:
+            logger.info('Trajectory is outside the range of a single UTM zone, using AEQD')
+
+    if utm_srid is not None:
+        crs = f"EPSG:{utm_srid}"
+        srid = utm_srid
+    else:
+        crs = f"+proj=aeqd +lat_0={centroid.y} +lon_0={centroid.x} +units=m +datum=WGS84 +no_defs"
+        srid = 0  # no SRID for a custom projection
 
-    transformer = Transformer.from_crs(
-        "EPSG:4326", CRS.from_proj4(proj4text), always_xy=True)
-    points = [Point(transformer.transform(p.x, p.y)) for p in points]
+    # all samples are projected in one call, trips are views over the coordinate array
+    coordinates = shapely.get_coordinates(
+        transform_geometries(points, "EPSG:4326", crs))
 
     logger.info('Processing trips')
     if trip_iri is not None:
         # split trajectory into trips
-        trips = _process_trip(trip_list, points, timestamp_list)
+        trips = split_trips(time_series.get_value_list(
+            trip_iri), coordinates, time_series.times)
     else:
         # entire trajectory considered as a single trip
-        trips = [Trip(full_points_list=points,
-                      lower_index=0,
-                      upper_index=len(points) - 1,
-                      full_time_list=timestamp_list)]
+        trips = [Trip(lower_index=0,
+                      upper_index=len(coordinates) - 1,
+                      coordinates=coordinates,
+                      times=time_series.times)]
 
-    exposure_dataset = get_exposure_dataset(calculation_input.exposure)
+    if exposure_dataset is None:
+        exposure_dataset = get_exposure_dataset(calculation_input.exposure)
 
-    with open(rdf_type_to_sql_path[calculation_input.calculation_metadata.rdf_type], "r") as f:
+    if BATCH_CALCULATION:
+        sql_path = rdf_type_to_batch_sql_path[calculation_input.calculation_metadata.rdf_type]
+    else:
+        sql_path = rdf_type_to_sql_path[calculation_input.calculation_metadata.rdf_type]
+    with open(sql_path, "r") as f:
         calculation_sql = f.read()
 
     # create temp table for efficiency
@@ -93,47 +146,83 @@ def trajectory(calculation_input: CalculationInput):
     else:
         geometry_column = constants.VECTOR_GEOMETRY_COLUMN
 
-    columns = ["""ST_Transform(ST_Transform({GEOMETRY_COLUMN}, 4326), '{PROJ4_TEXT}') AS wkb_geometry""".format(
-        GEOMETRY_COLUMN=geometry_column, PROJ4_TEXT=proj4text)]
-
-    # different calculation types require different additional columns
-    # area weighted sum requires area and associated value of each pixel
-    # time filter needs the iri of the feature for time filtering later, where data are stored as triples
-    if calculation_input.calculation_metadata.rdf_type == constants.TRAJECTORY_AREA_WEIGHTED_SUM:
-        columns.append(exposure_dataset.area_column + ' AS area')
-    elif calculation_input.calculation_metadata.rdf_type in [constants.TRAJECTORY_TIME_FILTER_COUNT, constants.TRAJECTORY_TIME_FILTER_COUNT_DETAILED]:
-        columns.append(exposure_dataset.iri_column + ' AS iri')
-
-    select_clause = ",\n       ".join(columns)
+    extra_columns = _get_extra_columns(
+        calculation_input.calculation_metadata.rdf_type, exposure_dataset)
 
-    with open("agent/calculation/resources/temp_table_trajectory.sql", "r") as f:
-        temp_table_sql = f.read()
-    temp_table_sql = temp_table_sql.format(
-        TEMP_TABLE=temp_table, SELECT_CLAUSE=select_clause, EXPOSURE_DATASET=exposure_dataset.table_name)
+    if utm_srid is not None:
+        # persistent copy in the UTM zone, built once and shared between requests
+        if get_exposure_table is not None:
+            temp_table = get_exposure_table(utm_srid)
+        else:
+            temp_table = prepare_exposure_cache(
+                exposure_dataset, [], utm_srid, extra_columns)
+    else:
+        if get_exposure_table is not None:
+            # features around the trajectory are projected from the shared indexed copy in EPSG:4326
+            # instead of the dataset, the geometries are the same as ST_Transform of the dataset to 4326
+            source_table = get_exposure_table(4326)
+            source_geometry_column = 'wkb_geometry'
+            # the copy holds the extra columns under their aliases
+            source_columns = [column.split(' AS ')[-1]
+                              for column in extra_columns]
+        else:
+            source_table = exposure_dataset.table_name
+            source_geometry_column = geometry_column
+            source_columns = extra_columns
+
+        columns = ["""ST_Transform(ST_Transform({GEOMETRY_COLUMN}, 4326), '{PROJ4_TEXT}') AS wkb_geometry""".format(
+            GEOMETRY_COLUMN=source_geometry_column, PROJ4_TEXT=crs)] + source_columns
+
+        select_clause = ",\n       ".join(columns)
+
+        with open("agent/calculation/resources/temp_table_trajectory.sql", "r") as f:
+            temp_table_sql = f.read()
+        temp_table_sql = temp_table_sql.format(
+            TEMP_TABLE=temp_table, SELECT_CLAUSE=select_clause, EXPOSURE_DATASET=source_table,
+            GEOMETRY_COLUMN=source_geometry_column)
+
+        # envelope of the trajectory expanded by the calculation distance, features outside are not copied
+        extent_wkb = get_extent_wkb(
+            [shapely.multipoints(coordinates)], calculation_input.calculation_metadata.distance, crs)
 
     logger.info('Submitting SQL queries for calculations')
     with postgis_client.connect() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(temp_table_sql)
+            if utm_srid is None:
+                cur.execute(temp_table_sql, {
+                            'EXTENT_PLACEHOLDER': extent_wkb})
 
-            calculation_sql = calculation_sql.format(TEMP_TABLE=temp_table)
+            trajectories = build_trajectories(trips)
+            if BATCH_CALCULATION:
+                key_to_rows = _execute_trips_batch(
+                    cur, calculation_sql, temp_table, trajectories, srid, calculation_input.calculation_metadata.distance)
+            else:
+                calculation_sql = calculation_sql.format(TEMP_TABLE=temp_table)
 
-            for trip in tqdm(trips, mininterval=60, ncols=80, file=sys.stdout):
                 # two types of replacement, table name via python, variables via psycopg2,
                 # supposed to be more secure against sql injection like this
-                replacements = {
-                    'GEOMETRY_PLACEHOLDER': trip.trajectory.wkt,
-                    'DISTANCE_PLACEHOLDER': calculation_input.calculation_metadata.distance
-                }
-
-                cur.execute(calculation_sql, replacements)
-                if cur.description:
-                    query_result = cur.fetchall()
-                    if calculation_input.calculation_metadata.rdf_type in [constants.TRAJECTORY_TIME_FILTER_COUNT, constants.TRAJECTORY_TIME_FILTER_COUNT_DETAILED]:
-                        iri_wkt_dict = {row['iri']: row['wkt']
-                                        for row in query_result}
-                        trip.set_iri_wkt_dict(iri_wkt_dict)
-                    else:
+                wkb_params = to_wkb_params(trajectories)
+                key_to_params = {i: {'GEOMETRY_PLACEHOLDER': wkb, 'SRID_PLACEHOLDER': srid,
+                                     'DISTANCE_PLACEHOLDER': calculation_input.calculation_metadata.distance}
+                                 for i, wkb in enumerate(wkb_params)}
+
+                key_to_rows = execute_per_subject(
+                    cur, 'trajectory', calculation_sql, key_to_params)
+
+            if calculation_input.calculation_metadata.rdf_type in [constants.TRAJECTORY_TIME_FILTER_COUNT, constants.TRAJECTORY_TIME_FILTER_COUNT_DETAILED]:
+                # decode the features of all trips at once
+                rows = [(i, row['iri'], row['wkb'])
+                        for i, query_result in key_to_rows.items() for row in query_result]
+                geoms = from_wkb_values([wkb for _, _, wkb in rows])
+                trip_to_iri_geom_dict = {i: {} for i in key_to_rows}
+                for (i, iri, _), geom in zip(rows, geoms):
+                    trip_to_iri_geom_dict[i][iri] = geom
+                for i, iri_geom_dict in trip_to_iri_geom_dict.items():
+                    trips[i].set_iri_geom_dict(iri_geom_dict)
+            else:
+                for i, query_result in key_to_rows.items():
+                    trip = trips[i]
+                    if query_result:
                         # 1 trip is expected to have one row of result
                         if query_result[0]['exposure_result'] is None:
                             trip.set_exposure_result(0)
@@ -147,7 +236,8 @@ def trajectory(calculation_input: CalculationInput):
     # create a new column sharing the same time series with trajectory if it does not exist
     if result_iri is None:
         logger.info("No existing result IRI found. Creating one...")
-        instantiate_result_ontop(calculation_input=calculation_input)
+        with _result_lock:
+            instantiate_result_ontop(calculation_input=calculation_input)
         result_iri = _get_exposure_result(calculation_input)
         if result_iri is None:
             raise Exception("Failed to obtain new result IRI!")
@@ -163,9 +253,9 @@ def trajectory(calculation_input: CalculationInput):
         _process_time_filter(trips=trips, timezone=timezone,
                              exposure_dataset=exposure_dataset, calculation_type=calculation_input.calculation_metadata.rdf_type)
 
-    # create a Java time series object to upload to database
+    # create a Java time series object to upload to database, Java timestamps are only created here
     result_time_series = _create_result_time_series(
-        trips, result_iri=result_iri, time_list=java_time_list, ts_client=ts_client)
+        trips, result_iri=result_iri, time_list=time_series.get_timestamp_java(), ts_client=ts_client)
 
     # uploads data to database
     ts_client.add_time_series(result_time_series)
@@ -176,46 +266,104 @@ def trajectory(calculation_input: CalculationInput):
     return complete_message, 200
 
 
-def _process_trip(trip_index_array, points: list[Point], timestamp_list):
+def trajectory_batch(calculation_input: CalculationInput):
     """
-    returns a list of Trip objects
-   """
-    trips = []
-    current_trip_index = trip_index_array[0]  # index given by trip calculation
-    lowerbound_index = 0  # position in the trajectory array
-
-    # records a new trip every time the trip index changes
-    for i in range(1, len(trip_index_array)):
-        if trip_index_array[i] != current_trip_index:
-            upperbound_index = i - 1
+    Calculates a list of trajectories, each trajectory is processed end to end by one of
+    TRAJECTORY_WORKERS threads. The exposure dataset is looked up once and copied once (per UTM zone
+    with the UTM engine, to EPSG:4326 with AEQD), the copies are shared by all workers. With AEQD each
+    trajectory only projects the features around it from the shared copy. Returns the status of every subject
+    """
+    subjects = list(dict.fromkeys(calculation_input.subject))
+    exposure_dataset = get_exposure_dataset(calculation_input.exposure)
+    extra_columns = _get_extra_columns(
+        calculation_input.calculation_metadata.rdf_type, exposure_dataset)
+
+    srid_to_table = {}
+    table_lock = threading.Lock()
+
+    def get_exposure_table(srid: int):
+        # the first trajectory of an SRID prepares the copy, the others wait for it
+        with table_lock:
+            if srid not in srid_to_table:
+                srid_to_table[srid] = prepare_exposure_cache(
+                    exposure_dataset, [], srid, extra_columns)
+            return srid_to_table[srid]
+
+    def calculate(subject):
+        subject_input = CalculationInput(
+            subject=subject, exposure=calculation_input.exposure, calculation_metadata=calculation_input.calculation_metadata)
+        return trajectory(subject_input, exposure_dataset, get_exposure_table)
+
+    logger.info(f"Calculating {len(subjects)} trajectories")
+    subject_to_status = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(TRAJECTORY_WORKERS, len(subjects)))) as executor:
+        future_to_subject = {executor.submit(
+            calculate, subject): subject for subject in subjects}
+        for future in tqdm(as_completed(future_to_subject), total=len(future_to_subject), mininterval=60, ncols=80, file=sys.stdout):
+            subject = future_to_subject[future]
+            try:
+                if future.result() is None:
+                    subject_to_status[subject] = {'status': 'empty'}
+                else:
+                    subject_to_status[subject] = {'status': 'completed'}
+            except Exception as e:
+                # one failing trajectory does not stop the others
+                logger.error(f"Trajectory calculation failed for {subject}: {e}")
+                subject_to_status[subject] = {'status': 'failed', 'error': str(e)}
+
+    failed = sum(1 for status in subject_to_status.values()
+                 if status['status'] == 'failed')
+    logger.info(
+        f"Trajectory calculations complete, {failed} of {len(subjects)} failed")
+
+    # results in the order of the request
+    return {subject: subject_to_status[subject] for subject in subjects}, 200
+
+
+def _get_extra_columns(rdf_type: str, exposure_dataset: ExposureDataset):
+    # different calculation types require different additional columns
+    # area weighted sum requires area and associated value of each pixel
+    # time filter needs the iri of the feature for time filtering later, where data are stored as triples
+    extra_columns = []
+    if rdf_type == constants.TRAJECTORY_AREA_WEIGHTED_SUM:
+        extra_columns.append(exposure_dataset.area_column + ' AS area')
+        extra_columns.append(exposure_dataset.value_column + ' AS val')
+    elif rdf_type in [constants.TRAJECTORY_TIME_FILTER_COUNT, constants.TRAJECTORY_TIME_FILTER_COUNT_DETAILED]:
+        extra_columns.append(exposure_dataset.iri_column + ' AS iri')
+    return extra_columns
 
-            trips.append(
-                Trip(upper_index=upperbound_index,
-                     lower_index=lowerbound_index,
-                     full_points_list=points,
-                     full_time_list=timestamp_list))
 
-            lowerbound_index = i
-            current_trip_index = trip_index_array[i]
-        elif i == len(trip_index_array) - 1:
-            upperbound_index = i
+def _execute_trips_batch(cur, batch_sql: str, temp_table: str, trajectories, srid: int, distance: float):
+    """
+    Loads all trip geometries into the session subject table with one COPY and answers every trip
+    with a single grouped query, returns a dictionary of trip position to its rows (without subject)
+    """
+    create_subject_table(cur)
+    load_subject_table(cur, SUBJECT_TABLE, {str(i): geom for i, geom in enumerate(
+        trajectories)}, srid)
+
+    params = {'DISTANCE_PLACEHOLDER': distance}
+    if TRAJECTORY_SEGMENT_LENGTH > 0:
+        # vertices at most a quarter segment apart, pieces of at most 5 vertices
+        segment_expression = "ST_Subdivide(ST_Segmentize(s.geom, %(SEGMENT_SPACING_PLACEHOLDER)s), 5)"
+        params['SEGMENT_SPACING_PLACEHOLDER'] = TRAJECTORY_SEGMENT_LENGTH / 4
+    else:
+        segment_expression = "s.geom"
 
-            trips.append(Trip(upper_index=upperbound_index,
-                              lower_index=lowerbound_index,
-                         full_points_list=points,
-                         full_time_list=timestamp_list))
+    cur.execute(batch_sql.format(SUBJECT_TABLE=SUBJECT_TABLE, TEMP_TABLE=temp_table, SEGMENT_EXPRESSION=segment_expression),
+                params)
 
-    return trips
+    key_to_rows = {i: [] for i in range(len(trajectories))}
+    for row in cur.fetchall():
+        key_to_rows[int(row['subject'])].append(
+            {k: v for k, v in row.items() if k != 'subject'})
+    return key_to_rows
 
 
 def _create_result_time_series(trips: list[Trip], result_iri: str, time_list, ts_client: TimeSeriesClient):
-    result_list = []
-
-    for trip in trips:
-        # repeat the same value for each portion of the trip in each time row
-        size = trip.upper_index - trip.lower_index + 1
-        temp_list = [trip.exposure_result] * size
-        result_list.extend(temp_list)
+    # repeat the same value for each portion of the trip in each time row
+    result_list = np.repeat(np.array([trip.exposure_result for trip in trips], dtype=object),
+                            [len(trip) for trip in trips]).tolist()
 
     return ts_client.create_time_series(times=time_list, data_iri_list=[result_iri], values=[result_list])
 
@@ -270,26 +418,36 @@ def _get_exposure_result(calculation_input: CalculationInput):
                         query_result.toString())
 
 
-def _get_time_series_sparql(subject: str, trip: str, lowerbound, upperbound):
+def _get_time_series(subject: str, trip: str, lowerbound, upperbound):
     from agent.utils.kg_client import kg_client
 
     # check time class, exception will be thrown if checks fail
     kg_client.check_time_class(subject)
 
+    # read from the time series table directly, SPARQL is only used if it cannot be resolved
+    time_series = read_trajectory(subject, trip, lowerbound, upperbound)
+    if time_series is None:
+        logger.info('Falling back to SPARQL for the time series')
+        return _get_time_series_sparql(subject, trip, lowerbound, upperbound)
+
+    return time_series
+
+
+def _get_time_series_sparql(subject: str, trip: str, lowerbound, upperbound):
+    from agent.utils.kg_client import kg_client
+
     values_list = [subject]
     if trip is not None:
         values_list.append(trip)
     time_series = kg_client.get_time_series_data(
         values_list, lowerbound, upperbound)
 
-    points = [wkt.loads(s) for s in time_series.get_value_list(subject)]
-
-    if trip is not None:
-        trip_list = time_series.get_value_list(trip)
-    else:
-        trip_list = []
+    # WKT literals are parsed in one call so that both readers return geometries
+    if subject in time_series.get_measures():
+        time_series.add_value(subject, shapely.from_wkt(
+            time_series.get_value_list(subject)))
 
-    return points, trip_list, time_series.get_timestamp_java(subject), time_series.get_timestamp(subject)
+    return time_series
 
 
 def _get_time_zone(centroid: Point):
@@ -306,8 +464,7 @@ def _get_time_zone(centroid: Point):
     }}
     """
 
-    query_result = json.loads(
-        kg_client.remote_store_client.executeQuery(query).toString())
+    query_result = kg_client.query(query)
 
     if len(query_result) == 1:
         return query_result[0]['tzid']
@@ -341,15 +498,15 @@ def _process_time_filter(trips: list[Trip], timezone: str, exposure_dataset: Exp
     if not iri_list:
         return
 
-    # combine dicts holding wkt values, some features may appear in multiple trips
-    combined_iri_wkt_dict = {}
+    # combine dicts holding geometries, some features may appear in multiple trips
+    combined_iri_geom_dict = {}
     for trip in trips_to_consider:
-        combined_iri_wkt_dict.update(trip.iri_wkt_dict)
+        combined_iri_geom_dict.update(trip.iri_geom_dict)
 
     # remove duplicates
     iri_set = set(iri_list)
     business_establishments = {
-        iri: BusinessEstablishment(iri=iri, wkt_string=combined_iri_wkt_dict[iri]) for iri in iri_set}
+        iri: BusinessEstablishment(iri=iri, geom=combined_iri_geom_dict[iri]) for iri in iri_set}
 
     _set_business_start_end(business_establishments)
     _set_regular_schedules(business_establishments)
@@ -372,8 +529,7 @@ def _set_business_start_end(business_establishments: dict[str, BusinessEstablish
         business_start_end_sparql = f.read().format(
             VALUES_CLAUSE=values_clause, VARNAME=varname)
 
-    query_result = json.loads(kg_client.remote_store_client.executeQuery(
-        business_start_end_sparql).toString())
+    query_result = kg_client.query(business_start_end_sparql)
 
     # please refer to the template for the variable names
     for entry in query_result:
@@ -398,8 +554,7 @@ def _set_adhoc_schedules(business_establishments: dict[str, BusinessEstablishmen
         opening_hours_sparql = f.read().format(
             VALUES_CLAUSE=values_clause, VARNAME=varname)
 
-    query_result = json.loads(kg_client.remote_store_client.executeQuery(
-        opening_hours_sparql).toString())
+    query_result = kg_client.query(opening_hours_sparql)
 
     feature_to_schedule_dict = {}  # multiple schedules allowed
     schedule_start_date_dict = {}  # single value only, optional
@@ -479,8 +634,7 @@ def _set_regular_schedules(business_establishments: dict[str, BusinessEstablishm
         opening_hours_sparql = f.read().format(
             VALUES_CLAUSE=values_clause, VARNAME=varname)
 
-    query_result = json.loads(kg_client.remote_store_client.executeQuery(
-        opening_hours_sparql).toString())
+    query_result = kg_client.query(opening_hours_sparql)
 
     feature_to_schedule_dict = {}  # multiple schedules allowed
     schedule_days_dict = {}  # multiple days allowed
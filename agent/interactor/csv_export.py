@@ -2,6 +2,7 @@ from itertools import product
 import re
 from flask import Blueprint, Response, request
 from twa import agentlogging
+from agent.calculation.subject_store import get_subject_geometries
 from agent.interactor.trigger_calculation import get_dataset_iri
 from agent.objects.calculation_metadata import CalculationMetadata, get_dataset_filter_where_clauses
 import agent.utils.constants as constants
@@ -10,11 +11,8 @@ from rdflib.plugins.sparql.parser import parseQuery
 from agent.utils.stack_configs import BLAZEGRAPH_URL, ONTOP_URL
 import csv
 import io
-from shapely import wkt
+import shapely
 from collections import defaultdict
-import json
-from tqdm import tqdm
-import sys
 from datetime import datetime
 from agent.utils.postgis_client import postgis_client
 from psycopg2.extras import RealDictCursor
@@ -190,21 +188,20 @@ def trajectory():
             data_iri_list_to_query.extend(distance_to_result_dict.values())
 
     logger.info('Querying time series')
+    # values are written as received
     time_series = kg_client.get_time_series_data(
-        data_iri_list_to_query, lowerbound, upperbound)
-    points = [wkt.loads(s) for s in time_series.get_value_list(subject)]
-
-    time_list = time_series.get_timestamp_java(subject)
+        data_iri_list_to_query, lowerbound, upperbound, raw=True)
+    # times are written like the toString() of their Java time class, without creating Java objects
+    time_class = None
+    if not time_series.is_numeric_time():
+        time_class = kg_client.get_java_time_class(subject)
+    time_list = time_series.get_java_time_strings(time_class)
     data_to_write = [time_list]
     headers = ['time']
 
     if include_lat_lng.lower() == 'true':
-        lat_list = []
-        lng_list = []
-        for point in points:
-            lat_list.append(point.y)
-            lng_list.append(point.x)
-        data_to_write.extend([lat_list, lng_list])
+        points = shapely.from_wkt(time_series.get_value_list(subject))
+        data_to_write.extend([shapely.get_y(points).tolist(), shapely.get_x(points).tolist()])
         headers.extend(['lat', 'lng'])
 
     if trip_iri is not None:
@@ -237,10 +234,10 @@ def _get_subject_to_result_dict(subject, exposure, calculation_type):
     from agent.utils.kg_client import kg_client
     subject_to_result_dict = defaultdict(lambda: defaultdict(dict))
 
-    for chunk in tqdm(_chunk_list(subject), mininterval=60, ncols=80, file=sys.stdout):
+    def build_query(chunk):
         values = " ".join(f"<{s}>" for s in chunk)
         # SERVICE is used here to speed up the queries..
-        query = f"""
+        return f"""
         SELECT ?subject ?value ?distance
         WHERE {{
             SERVICE <{BLAZEGRAPH_URL}> {{?calculation a <{calculation_type}>;
@@ -254,10 +251,8 @@ def _get_subject_to_result_dict(subject, exposure, calculation_type):
         }}
         """
 
-        # remote store client gives a Java JSONArray
-        query_result = json.loads(
-            kg_client.remote_store_client.executeQuery(query).toString())
-
+    # chunks are queried concurrently, the chunk size adapts to the endpoint
+    for query_result in kg_client.query_values(subject, build_query, 'subject_result', initial_chunk_size=1000):
         for item in query_result:
             iri = item['subject']
             distance = item['distance']
@@ -271,9 +266,9 @@ def _get_subject_to_result_dict_calc_iri(subject, exposure, calculation_iri):
     from agent.utils.kg_client import kg_client
     subject_to_result_dict = defaultdict(lambda: defaultdict(dict))
 
-    for chunk in tqdm(_chunk_list(subject), mininterval=60, ncols=80, file=sys.stdout):
+    def build_query(chunk):
         values = " ".join(f"<{s}>" for s in chunk)
-        query = f"""
+        return f"""
         SELECT ?subject ?value
         WHERE {{
             VALUES ?subject {{{values}}}
@@ -284,11 +279,9 @@ def _get_subject_to_result_dict_calc_iri(subject, exposure, calculation_iri):
                 <{constants.HAS_CALCULATION_METHOD}> <{calculation_iri}>.
         }}
         """
-        # remote store client gives a Java JSONArray
-        # send directly to ontop to speed up
-        query_result = json.loads(
-            kg_client.ontop_client.executeQuery(query).toString())
 
+    # send directly to ontop to speed up, chunks are queried concurrently
+    for query_result in kg_client.query_values(subject, build_query, 'subject_result_calc_iri', endpoint='ontop', initial_chunk_size=1000):
         for item in query_result:
             iri = item['subject']
             subject_to_result_dict[iri] = item['value']
@@ -342,8 +335,7 @@ def _get_distance_to_result_dict(subject, exposure, calculation_type):
     }}
     """
 
-    query_result = json.loads(
-        kg_client.remote_store_client.executeQuery(query).toString())
+    query_result = kg_client.query(query)
     for row in query_result:
         distance_to_result_dict[row['distance']] = row['result']
 
@@ -387,16 +379,13 @@ def _get_subject_to_label_dict(subject_label_query_file, subjects):
         query_template = f.read()
     subject_to_label_dict = {}
 
-    for chunk in _chunk_list(subjects):
-        query = _insert_values_clause(
-            sparql_query=query_template, varname='Feature', uris=chunk)
-
-        query_result = kg_client.remote_store_client.executeQuery(query)
+    def build_query(chunk):
+        return _insert_values_clause(sparql_query=query_template, varname='Feature', uris=chunk)
 
-        for i in range(query_result.length()):
-            subject_iri = query_result.getJSONObject(i).getString('Feature')
-            subject_label = query_result.getJSONObject(i).getString('Label')
-            subject_to_label_dict[subject_iri] = subject_label
+    # chunks are queried concurrently, the chunk size adapts to the endpoint
+    for query_result in kg_client.query_values(subjects, build_query, 'subject_label', initial_chunk_size=1000):
+        for row in query_result:
+            subject_to_label_dict[row['Feature']] = row['Label']
 
     return subject_to_label_dict
 
@@ -417,46 +406,8 @@ def _get_subject_to_point_dict(subject):
     """
     Identical to the one use by core agent but does not convert lat lon..
     """
-    from agent.utils.kg_client import kg_client
-
-    iri_to_point_dict = {}
-
-    query_template = """
-    SELECT ?subject ?wkt
-    WHERE {{
-        VALUES ?subject {{{values}}}.
-        ?subject <http://www.opengis.net/ont/geosparql#asWKT> ?wkt.
-    }}
-    """
-
-    logger.info(
-        'Querying geometries of subjects, number of subjects: ' + str(len(subject)))
-
-    query_list = []
-    # submit queries in batches to avoid crashing ontop
-    for chunk in _chunk_list(subject):
-        values = " ".join(f"<{s}>" for s in chunk)
-        query = query_template.format(values=values)
-        query_list.append(query)
-
-    for query in query_list:
-        query_result = json.loads(
-            kg_client.remote_store_client.executeQuery(query).toString())
-
-        for row in query_result:
-            sub = row['subject']
-            wkt_literal = row['wkt']
-
-            # strip RDF literal IRI, i.e. ^^<http://www.opengis.net/ont/geosparql#wktLiteral>
-            match = re.match(r'^"(.+)"\^\^<.+>$', wkt_literal)
-            if match:
-                geom = wkt.loads(match.group(1))
-            else:
-                geom = wkt.loads(wkt_literal)
-
-            iri_to_point_dict[sub] = geom
-
-    return iri_to_point_dict
+    # read from the local subject geometry store, the knowledge graph is only queried for unknown or stale subjects
+    return get_subject_geometries(subject)
 
 
 def _get_trip(point_iri: str):
@@ -642,8 +593,7 @@ def _get_calculations(rdf_type: str, dataset_filters: list[dict]) -> list[Calcul
                                       dataset_filter_clauses="\n".join(
                                           dataset_filter_where_clauses), blazegraph_url=BLAZEGRAPH_URL)
 
-        query_results = json.loads(
-            kg_client.remote_store_client.executeQuery(query).toString())
+        query_results = kg_client.query(query)
 
         calc_to_distance = {}
 
@@ -662,8 +612,7 @@ def _get_calculations(rdf_type: str, dataset_filters: list[dict]) -> list[Calcul
         query = query_template.format(rdf_type=rdf_type, has_distance=constants.HAS_DISTANCE,
                                       dataset_filter_clauses='', blazegraph_url=BLAZEGRAPH_URL)
 
-        query_results = json.loads(
-            kg_client.remote_store_client.executeQuery(query).toString())
+        query_results = kg_client.query(query)
 
         calc_to_distance = {}
 
@@ -682,11 +631,6 @@ def _get_calculations(rdf_type: str, dataset_filters: list[dict]) -> list[Calcul
     return calculations
 
 
-def _chunk_list(values, chunk_size=1000):
-    for i in range(0, len(values), chunk_size):
-        yield values[i:i + chunk_size]
-
-
 @csv_export_bp.route('/greenspace_deprecated', methods=['GET'])
 def greenspace():
     # IRI(s) of subject to calculate
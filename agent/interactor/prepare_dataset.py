@@ -0,0 +1,54 @@
+from flask import Blueprint, request
+from itertools import product
+from twa import agentlogging
+from agent.calculation.exposure_cache import prepare_exposure_cache
+from agent.interactor.trigger_calculation import get_dataset_iri
+from agent.objects.exposure_dataset import get_exposure_dataset
+from agent.utils.env_configs import BATCH_CALCULATION
+
+logger = agentlogging.get_logger('dev')
+
+prepare_dataset_bp = Blueprint(
+    'prepare_dataset', __name__, url_prefix='/prepare_dataset')
+
+
+@prepare_dataset_bp.route('/', methods=['POST'])
+def prepare_dataset():
+    # example input of JSON request body
+    # {
+    #     "exposure_table": "parks",
+    #     "dataset_filter_values": {
+    #         "year": [
+    #             2015,
+    #             2016
+    #         ]
+    #     }
+    # }
+
+    # builds the cached projected copies of a vector exposure dataset in advance, the dataset filters are combined
+    # in the same way as /trigger_calculation/bulk so that the calculations reuse these copies
+    inputs = request.json
+    exposure_table = inputs['exposure_table']
+
+    dataset_filters = [{}]
+    if 'dataset_filter_values' in inputs:
+        dataset_filter_values = inputs['dataset_filter_values']
+        dataset_filters = [
+            dict(zip(dataset_filter_values.keys(), combo))
+            for combo in product(*dataset_filter_values.values())
+        ]
+
+    exposure_dataset = get_exposure_dataset(
+        get_dataset_iri(table_name=exposure_table))
+
+    # single calculations (and bulk calculations without BATCH_CALCULATION) look up one dataset filter at a time,
+    # batched bulk calculations look up all dataset filters at once
+    cache_keys = [[dataset_filter] for dataset_filter in dataset_filters]
+    if BATCH_CALCULATION and len(dataset_filters) > 1:
+        cache_keys.append(dataset_filters)
+
+    logger.info(f"Preparing exposure cache for {exposure_table}")
+    cache_tables = [prepare_exposure_cache(exposure_dataset=exposure_dataset, dataset_filters=key, srid=3857)
+                    for key in cache_keys]
+
+    return f"Prepared {', '.join(cache_tables)} for {exposure_table}"
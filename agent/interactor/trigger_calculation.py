@@ -1,13 +1,14 @@
 from flask import Blueprint, request
 from itertools import product
 from twa import agentlogging
-from agent.calculation.api import do_calculation
+from agent.calculation.api import do_calculation, do_multi_calculation, multi_function_map
 from agent.interactor.initialise_calculation import initialise_calculation
 from agent.objects.calculation_metadata import CalculationMetadata
 import agent.utils.constants as constants
 from pathlib import Path
 from rdflib.plugins.sparql.parser import parseQuery
 from agent.utils.ts_client import TimeSeriesClient
+from agent.utils.env_configs import BATCH_CALCULATION
 import json
 
 logger = agentlogging.get_logger('dev')
@@ -102,8 +103,7 @@ def bulk_trigger_calculation():
 
         logger.info(
             'Querying subject IRIs with provided SPARQL query template')
-        query_result = json.loads(
-            kg_client.remote_store_client.executeQuery(query).toString())
+        query_result = kg_client.query(query)
 
         logger.info('Received ' + str(len(query_result)) + ' IRIs')
 
@@ -119,23 +119,28 @@ def bulk_trigger_calculation():
     exposure_dataset_iri = get_dataset_iri(table_name=exposure_table)
 
     for rdf_type in rdf_types:
-        for distance in distances:
-            for dataset_filter in dataset_filters:
-                # this will initialise a calculation if it does not exist and return the instantiated iri, or return an existing iri
-                calculation_iri = initialise_calculation(CalculationMetadata(
-                    rdf_type=rdf_type, distance=distance, upperbound=upperbound, lowerbound=lowerbound, dataset_filter=dataset_filter))
-
-                logger.info('Calling core calculation agent')
-
+        # this will initialise a calculation if it does not exist and return the instantiated iri, or return an existing iri
+        calculation_iris = [initialise_calculation(CalculationMetadata(
+            rdf_type=rdf_type, distance=distance, upperbound=upperbound, lowerbound=lowerbound, dataset_filter=dataset_filter))
+            for dataset_filter in dataset_filters for distance in distances]
+
+        logger.info('Calling core calculation agent')
+
+        if BATCH_CALCULATION and rdf_type in multi_function_map:
+            # all distances and dataset filters are evaluated in a single pass
+            do_multi_calculation(subject=subject if subject is not None else subject_list,
+                                 calculations=calculation_iris, exposure=exposure_dataset_iri)
+        else:
+            for calculation_iri in calculation_iris:
                 # call core calculation agent
                 do_calculation(subject=subject if subject is not None else subject_list,
                                calculation=calculation_iri, exposure=exposure_dataset_iri)
 
-                logger.info(
-                    f"""
-                        Completed calculation for: rdf_type={rdf_type}, distance={distance}, upperbound={upperbound}, 
-                        lowerbound={lowerbound}, dataset_filter={dataset_filter}
-                    """)
+        logger.info(
+            f"""
+                Completed calculation for: rdf_type={rdf_type}, distances={distances}, upperbound={upperbound}, 
+                lowerbound={lowerbound}, dataset_filters={dataset_filters}
+            """)
 
     return f"Finished all calculations for request: {inputs}"
 
@@ -181,8 +186,7 @@ def trigger_calculation():
 
         logger.info(
             'Querying subject IRIs with provided SPARQL query template')
-        query_result = json.loads(
-            kg_client.remote_store_client.executeQuery(query).toString())
+        query_result = kg_client.query(query)
 
         logger.info('Received ' + str(len(query_result)) + ' IRIs')
 
@@ -2,8 +2,8 @@
 from datetime import date, datetime
 from zoneinfo import ZoneInfo
 from twa import agentlogging
-from shapely import wkt
 from shapely.strtree import STRtree
+import numpy as np
 
 from agent.objects.schedule import RegularSchedule, AdHocSchedule
 from agent.objects.trip import Trip
@@ -12,7 +12,7 @@ logger = agentlogging.get_logger('dev')
 
 
 class BusinessEstablishment():
-    def __init__(self, iri, wkt_string):
+    def __init__(self, iri, geom):
         self.iri = iri
         self.start_and_end = []
         self.ad_hoc_schedule_dict: dict[date, AdHocSchedule] = {}
@@ -20,7 +20,7 @@ class BusinessEstablishment():
 
         # key is isoweekday, each day can have multiple schedules but the schedules should not overlap
         self.regular_schedule_dict: dict[int, list[RegularSchedule]] = {}
-        self.geom = wkt.loads(wkt_string)
+        self.geom = geom
 
     def add_business_start_and_end(self, business_start, business_end):
         if (business_start, business_end) in self.start_and_end:
@@ -125,12 +125,14 @@ class BusinessEstablishment():
     def is_open_closest_point(self, trip: Trip):
         # finds the closest point within the trip to this business establishment
         tree = STRtree(trip.points_list)
-        closest_point = trip.points_list[tree.nearest(self.geom)]
+        closest_index = tree.nearest(self.geom)
 
         # handle duplicate coordinates if they exist
-        matching_indices = [i for i, p in enumerate(
-            trip.points_list) if p == closest_point]
-        matched_time_list = [trip.time_list[i] for i in matching_indices]
+        coordinates = trip.coordinates[trip.lower_index:trip.upper_index + 1]
+        matching_indices = np.flatnonzero(
+            (coordinates == coordinates[closest_index]).all(axis=1))
+        time_list = trip.time_list
+        matched_time_list = [time_list[i] for i in matching_indices]
 
         # check if any time value falls within any opening hours
         exposed = False
@@ -1,4 +1,3 @@
-import json
 import uuid
 from agent.utils import constants
 from dateutil.parser import parse
@@ -152,8 +151,7 @@ def get_calculation_metadata(iri: str) -> CalculationMetadata:
     }}
     """
 
-    query_results = json.loads(
-        kg_client.remote_store_client.executeQuery(query).toString())
+    query_results = kg_client.query(query)
 
     rdf_type = None
     distance = None
@@ -2,7 +2,6 @@ from dataclasses import dataclass
 from typing import Optional
 from agent.utils import constants
 from agent.utils.env_configs import STACK_NAME
-import json
 from datetime import date
 
 
@@ -13,6 +12,8 @@ class ExposureDataset:
     geometry_column: str = None
     # used for area weighted calculation, pre-calculated area of a polygon (converted from pixel)
     area_column: Optional[str] = None
+    # used for area weighted calculation of vector datasets (trajectory), value of each polygon
+    value_column: Optional[str] = None
     # used for time filtering
     iri_column: Optional[str] = None
     # used to determine if this feature exists
@@ -26,7 +27,7 @@ def get_exposure_dataset(dataset_iri):
     PREFIX dcterms: <http://purl.org/dc/terms/>
     PREFIX dcat: <http://www.w3.org/ns/dcat#>
 
-    SELECT ?url ?table_name ?geometry_column ?area_column ?iri_column ?start_date ?end_date
+    SELECT ?url ?table_name ?geometry_column ?area_column ?value_column ?iri_column ?start_date ?end_date
     WHERE {{
         ?catalog <{constants.DATASET_PREDICATE}> <{dataset_iri}>.
         <{dataset_iri}> <{constants.DCTERM_TITLE}> ?table_name.
@@ -36,6 +37,9 @@ def get_exposure_dataset(dataset_iri):
         OPTIONAL {{
             <{dataset_iri}> <{constants.HAS_AREA_COLUMN}> ?area_column.
         }}
+        OPTIONAL {{
+            <{dataset_iri}> <{constants.HAS_VALUE_COLUMN}> ?value_column.
+        }}
         OPTIONAL {{
             <{dataset_iri}> <{constants.HAS_IRI_COLUMN}> ?iri_column.
         }}
@@ -48,8 +52,7 @@ def get_exposure_dataset(dataset_iri):
             <{constants.ENDPOINT_URL}> ?url.
     }}
     """
-    query_result = json.loads(
-        kg_client.remote_store_client.executeQuery(query).toString())
+    query_result = kg_client.query(query)
 
     if len(query_result) != 1:
         raise Exception('Unexpected query result size for exposure dataset')
@@ -70,6 +73,11 @@ def get_exposure_dataset(dataset_iri):
     else:
         exposure_dataset.area_column = 'area'
 
+    if 'value_column' in query_result[0]:
+        exposure_dataset.value_column = query_result[0]['value_column']
+    else:
+        exposure_dataset.value_column = 'val'
+
     if 'iri_column' in query_result[0]:
         exposure_dataset.iri_column = query_result[0]['iri_column']
     else:
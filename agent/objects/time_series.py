@@ -1,32 +1,69 @@
+from datetime import datetime, timezone
+import numpy as np
+
+
 class TimeSeries:
     """
     This class is used to store time series values queried from the KG
     The key to the dictionaries should be the IRI of the instance containing time series data
+    Data is stored column-wise, all measures share one time axis (datetime64[us] in UTC, or float
+    for numeric time positions) and each measure has one typed array of values.
+    Java timestamps are only created when requested, e.g. to upload results.
+    With raw_times (the time literals as received) values are kept as received as well, e.g. for exports
     """
 
-    def __init__(self):
-        self.timestamp_java_list: dict[str, list] = {}
-        self.values: dict[str, list] = {}
-        self.time_number: dict[str, list] = {}
-        self.timestamp: dict[str, list] = {}
+    def __init__(self, times: np.ndarray, java_time_converter=None, raw_times: list = None):
+        self.times = times
+        self.values: dict[str, np.ndarray] = {}
+        # converts a list of ISO 8601 strings (or numbers) to Java timestamps
+        self.java_time_converter = java_time_converter
+        self.timestamp_java_list = None
+        self.raw_times = raw_times
 
-    def add_timestamp_java(self, measure, timestamp_java_list):
-        self.timestamp_java_list[measure] = timestamp_java_list
-
-    def add_time_number(self, measure, time_number_list):
-        self.time_number[measure] = time_number_list
+    def add_value(self, measure, value_list):
+        if self.raw_times is not None:
+            self.values[measure] = np.asarray(value_list, dtype=object)
+        else:
+            self.values[measure] = _to_array(value_list)
 
-    def add_timestamp(self, measure, timestamp_list):
-        self.timestamp[measure] = timestamp_list
+    def is_numeric_time(self):
+        return self.times.dtype.kind != 'M'
 
-    def add_value(self, measure, value_list):
-        self.values[measure] = value_list
+    def get_timestamp_java(self, measure=None):
+        # measure is kept for compatibility, all measures share the same time axis
+        if self.timestamp_java_list is None:
+            if self.is_numeric_time():
+                self.timestamp_java_list = self.times.tolist()
+            else:
+                self.timestamp_java_list = self.java_time_converter(
+                    self.get_time_strings())
+        return self.timestamp_java_list
 
-    def get_timestamp_java(self, measure):
-        if measure in self.timestamp_java_list.keys():
-            return self.timestamp_java_list[measure]
+    def get_time_strings(self):
+        # ISO 8601 in UTC, fractions of a second are only written if present
+        if self.is_numeric_time():
+            return [str(t) for t in self.times.tolist()]
+        microseconds = self.times.astype(np.int64)
+        if not (microseconds % 1000000).any():
+            unit = 's'
+        elif not (microseconds % 1000).any():
+            unit = 'ms'
         else:
-            return self.time_number[measure]
+            unit = 'us'
+        return np.datetime_as_string(self.times, unit=unit, timezone='UTC').tolist()
+
+    def get_java_time_strings(self, time_class: str):
+        """
+        Times as written by toString() of the Java time class (java.time.Instant or java.time.ZonedDateTime),
+        without creating Java objects. ZonedDateTime keeps the offset of the received literals (needs raw_times)
+        """
+        if self.is_numeric_time():
+            return [str(t) for t in self.times.tolist()]
+        if time_class == 'java.time.ZonedDateTime' and self.raw_times is not None:
+            return [_zoned_date_time_string(datetime.fromisoformat(t)) for t in self.raw_times]
+        if time_class == 'java.time.ZonedDateTime':
+            return [_zoned_date_time_string(t.replace(tzinfo=timezone.utc)) for t in self.times.astype(object)]
+        return [_instant_string(t) for t in self.times.astype(object)]
 
     def get_value_list(self, measure):
         return self.values[measure]
@@ -34,5 +71,80 @@ class TimeSeries:
     def get_measures(self):
         return self.values.keys()
 
-    def get_timestamp(self, measure):
-        return self.timestamp[measure]
+    def get_timestamp(self, measure=None):
+        # timezone aware datetime objects, created on request
+        if self.is_numeric_time():
+            raise Exception('Time series does not have timestamps')
+        return [t.replace(tzinfo=timezone.utc) for t in self.times.astype(object)]
+
+    def __len__(self):
+        return len(self.times)
+
+
+def parse_timestamps(timestamp_list):
+    """
+    Parses xsd:dateTime strings into a datetime64[us] array in UTC, timestamps in UTC ('Z')
+    are parsed by numpy in one call, other offsets are converted individually
+    """
+    timestamps = np.asarray(timestamp_list, dtype=str)
+    if len(timestamps) == 0:
+        return np.array([], dtype='datetime64[us]')
+    if np.char.endswith(timestamps, 'Z').all():
+        return np.char.rstrip(timestamps, 'Z').astype('datetime64[us]')
+    return np.array([_to_naive_utc(datetime.fromisoformat(s)) for s in timestamps], dtype='datetime64[us]')
+
+
+def check_aligned(time_arrays: list):
+    # all measures of a time series must share the same times
+    if not all(np.array_equal(times, time_arrays[0]) for times in time_arrays[1:]):
+        raise Exception('Time values of measures are not aligned')
+
+
+def _to_naive_utc(timestamp: datetime):
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _instant_string(timestamp: datetime):
+    # Instant.toString(), seconds are always written
+    return timestamp.strftime('%Y-%m-%dT%H:%M:%S') + _java_fraction(timestamp.microsecond) + 'Z'
+
+
+def _zoned_date_time_string(timestamp: datetime):
+    # ZonedDateTime.toString(), seconds are left out when they and the fraction are zero
+    text = timestamp.strftime('%Y-%m-%dT%H:%M')
+    if timestamp.second or timestamp.microsecond:
+        text += timestamp.strftime(':%S') + _java_fraction(timestamp.microsecond)
+
+    offset = timestamp.utcoffset()
+    if offset is None or not offset:
+        return text + 'Z'
+    sign = '+' if offset.total_seconds() > 0 else '-'
+    seconds = abs(int(offset.total_seconds()))
+    text += f'{sign}{seconds // 3600:02d}:{seconds % 3600 // 60:02d}'
+    if seconds % 60:
+        text += f':{seconds % 60:02d}'
+    return text
+
+
+def _java_fraction(microsecond: int):
+    # fractions of a second are written in groups of three digits, and only if present
+    if not microsecond:
+        return ''
+    if microsecond % 1000 == 0:
+        return f'.{microsecond // 1000:03d}'
+    return f'.{microsecond:06d}'
+
+
+def _to_array(value_list):
+    # numeric literals become int or float arrays, anything else (e.g. WKT, geometries) is kept as objects
+    values = np.asarray(value_list)
+    if values.dtype.kind in 'US':
+        for dtype in (np.int64, np.float64):
+            try:
+                return values.astype(dtype)
+            except (ValueError, OverflowError):
+                pass
+        return values.astype(object)
+    return values
@@ -1,35 +1,116 @@
-from datetime import datetime
+from datetime import datetime, timezone
+import numpy as np
+import shapely
 from shapely.geometry import Point, LineString
 
 
 class Trip:
-    exposure_result = 0
+    """
+    View over the shared coordinate and time arrays of a trajectory, positions lower_index to
+    upper_index (inclusive). Points, geometry and datetime objects are only created when accessed
+    """
+    __slots__ = ('upper_index', 'lower_index', 'coordinates', 'times',
+                 'exposure_result', 'iri_geom_dict', '_trajectory')
 
-    def __init__(self, upper_index=None, lower_index=None, full_time_list: list[datetime] = None, full_points_list: list[Point] = None):
+    def __init__(self, upper_index: int, lower_index: int, coordinates: np.ndarray, times: np.ndarray):
         # positions in the trajectory point array
-        self.upper_index = upper_index
-        self.lower_index = lower_index
+        self.upper_index = int(upper_index)
+        self.lower_index = int(lower_index)
 
-        if upper_index == lower_index:  # LineString requires at least two points
-            self.points_list = [full_points_list[lower_index]]
-            self.trajectory = full_points_list[lower_index]
-        else:
-            # python slicing does not include the end index
-            self.points_list = full_points_list[lower_index:upper_index+1]
-            self.trajectory = LineString(self.points_list)
+        # (n, 2) array of the full trajectory and its datetime64 (UTC) times, shared between trips
+        self.coordinates = coordinates
+        self.times = times
 
-        # timebounds
-        self.lowerbound_time: datetime = full_time_list[lower_index]
-        self.upperbound_time: datetime = full_time_list[upper_index]
+        self.exposure_result = 0
+        self.iri_geom_dict = {}
+        self._trajectory = None
 
-        self.time_list = full_time_list[lower_index:upper_index+1]
+    @property
+    def trajectory(self):
+        if self._trajectory is None:
+            if self.upper_index == self.lower_index:  # LineString requires at least two points
+                self._trajectory = Point(self.coordinates[self.lower_index])
+            else:
+                self._trajectory = LineString(
+                    self.coordinates[self.lower_index:self.upper_index + 1])
+        return self._trajectory
+
+    @property
+    def points_list(self):
+        return shapely.points(self.coordinates[self.lower_index:self.upper_index + 1])
+
+    # timebounds
+    @property
+    def lowerbound_time(self) -> datetime:
+        return _to_datetime(self.times[self.lower_index])
+
+    @property
+    def upperbound_time(self) -> datetime:
+        return _to_datetime(self.times[self.upper_index])
+
+    @property
+    def time_list(self):
+        return [_to_datetime(t) for t in self.times[self.lower_index:self.upper_index + 1]]
+
+    def __len__(self):
+        return self.upper_index - self.lower_index + 1
 
     def set_exposure_result(self, exposure_result):
         self.exposure_result = exposure_result
 
-    def set_iri_wkt_dict(self, iri_wkt_dict: dict[str, str]):
+    def set_iri_geom_dict(self, iri_geom_dict: dict):
         # should be a property in the BusinesEstablishment class naturally, but placing it here due to convenience
-        self.iri_wkt_dict = iri_wkt_dict
+        self.iri_geom_dict = iri_geom_dict
 
     def get_iri_list(self):
-        return self.iri_wkt_dict.keys()
+        return self.iri_geom_dict.keys()
+
+
+def split_trips(trip_index_array, coordinates: np.ndarray, times: np.ndarray):
+    """
+    Returns a Trip for every run of equal trip indices, boundaries are found with numpy
+    """
+    trip_index_array = np.asarray(trip_index_array)
+    # position of the first point of each trip
+    starts = np.concatenate(
+        ([0], np.flatnonzero(trip_index_array[1:] != trip_index_array[:-1]) + 1))
+    stops = np.concatenate((starts[1:], [len(trip_index_array)])) - 1
+    return [Trip(upper_index=stop, lower_index=start, coordinates=coordinates, times=times)
+            for start, stop in zip(starts.tolist(), stops.tolist())]
+
+
+def build_trajectories(trips: list[Trip]):
+    """
+    Creates the geometries of all trips in two vectorised calls (lines and single points) and
+    returns them as an array, trips must share the same coordinate array
+    """
+    if not trips:
+        return np.array([], dtype=object)
+
+    coordinates = trips[0].coordinates
+    starts = np.array([trip.lower_index for trip in trips])
+    lengths = np.array([len(trip) for trip in trips])
+
+    # positions of the points of every trip, concatenated
+    offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    positions = np.arange(lengths.sum()) - offsets + np.repeat(starts, lengths)
+    trip_ids = np.repeat(np.arange(len(trips)), lengths)
+
+    geoms = np.empty(len(trips), dtype=object)
+    is_line = lengths > 1
+    if is_line.any():
+        line_points = is_line[trip_ids]
+        # indices have to be consecutive, single point trips are skipped
+        line_ids = (np.cumsum(is_line) - 1)[trip_ids[line_points]]
+        geoms[is_line] = shapely.linestrings(
+            coordinates[positions[line_points]], indices=line_ids)
+    if not is_line.all():
+        geoms[~is_line] = shapely.points(coordinates[starts[~is_line]])
+
+    for trip, geom in zip(trips, geoms):
+        trip._trajectory = geom
+    return geoms
+
+
+def _to_datetime(time: np.datetime64):
+    return time.astype('datetime64[us]').astype(datetime).replace(tzinfo=timezone.utc)
@@ -0,0 +1,67 @@
+import threading
+import requests
+from agent.utils.env_configs import SPARQL_MAX_CHUNK_SIZE, SPARQL_MIN_CHUNK_SIZE, SPARQL_TARGET_LATENCY
+from twa import agentlogging
+
+logger = agentlogging.get_logger('dev')
+
+# messages of errors caused by chunks that are too large for the endpoint
+OVERLOAD_MARKERS = ['outofmemory', 'java heap space',
+                    'gc overhead limit', 'timeout', 'timed out']
+
+
+class ChunkSizeTuner:
+    """
+    Number of VALUES per query for one endpoint and query shape. The size grows while queries
+    finish within SPARQL_TARGET_LATENCY and is halved when the endpoint is overloaded
+    """
+
+    def __init__(self, name: str, initial_size: int):
+        self.name = name
+        self.size = min(max(initial_size, SPARQL_MIN_CHUNK_SIZE),
+                        SPARQL_MAX_CHUNK_SIZE)
+        self.lock = threading.Lock()
+
+    def get_size(self):
+        with self.lock:
+            return self.size
+
+    def record_success(self, chunk_size: int, latency: float):
+        with self.lock:
+            # only full sized chunks say something about the current size
+            if latency < SPARQL_TARGET_LATENCY and chunk_size >= self.size and self.size < SPARQL_MAX_CHUNK_SIZE:
+                self.size = min(int(self.size * 1.5), SPARQL_MAX_CHUNK_SIZE)
+                logger.info(
+                    f"Chunk size of {self.name} increased to {self.size}")
+
+    def record_overload(self, chunk_size: int):
+        with self.lock:
+            new_size = max(min(self.size, chunk_size) // 2,
+                           SPARQL_MIN_CHUNK_SIZE)
+            if new_size < self.size:
+                self.size = new_size
+                logger.info(
+                    f"Chunk size of {self.name} reduced to {self.size}")
+
+
+# tuned sizes are kept for the lifetime of the process
+_tuners = {}
+_tuners_lock = threading.Lock()
+
+
+def get_tuner(endpoint: str, shape: str, initial_size: int):
+    with _tuners_lock:
+        key = (endpoint, shape)
+        if key not in _tuners:
+            _tuners[key] = ChunkSizeTuner(f"{shape} ({endpoint})", initial_size)
+        return _tuners[key]
+
+
+def is_overload(e: Exception):
+    # timeouts and out of memory errors of Ontop, also when reported through the Java client
+    if isinstance(e, requests.Timeout):
+        return True
+    if isinstance(e, requests.HTTPError) and e.response is not None and e.response.status_code in (500, 503, 504):
+        return True
+    message = str(e).lower()
+    return any(marker in message for marker in OVERLOAD_MARKERS)
@@ -27,6 +27,7 @@ HAS_CALCULATION_METHOD = PREFIX_EXPOSURE + 'hasCalculationMethod'
 # exposure dataset properties
 HAS_GEOMETRY_COLUMN = PREFIX_EXPOSURE + 'hasGeometryColumn'
 HAS_AREA_COLUMN = PREFIX_EXPOSURE + 'hasAreaColumn'
+HAS_VALUE_COLUMN = PREFIX_EXPOSURE + 'hasValueColumn'
 HAS_IRI_COLUMN = PREFIX_EXPOSURE + 'hasIriColumn'
 
 # time series related
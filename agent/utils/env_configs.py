@@ -2,7 +2,9 @@ import os
 
 
 def retrieve_default_settings():
-    global NAMESPACE, DATABASE, STACK_NAME
+    global NAMESPACE, DATABASE, STACK_NAME, BATCH_CALCULATION, CALCULATION_CHUNK_SIZE, CALCULATION_WORKERS, EXPOSURE_CACHE, PREPARED_STATEMENTS, PIPELINE_DEPTH, BUFFER_CACHE_SIZE, BUFFER_CACHE_TABLE, SUBJECT_STORE, SUBJECT_GEOMETRY_TTL, NATIVE_SPARQL, SPARQL_POOL_SIZE, SPARQL_MAX_IN_FLIGHT, \
+        SPARQL_TIMEOUT, SPARQL_MIN_CHUNK_SIZE, SPARQL_MAX_CHUNK_SIZE, SPARQL_TARGET_LATENCY, TRAJECTORY_SEGMENT_LENGTH, \
+        TRAJECTORY_ENGINE, TRAJECTORY_WORKERS, TIME_SERIES_MAX_IN_FLIGHT
 
     NAMESPACE = os.getenv("NAMESPACE")
     if NAMESPACE is None:
@@ -14,6 +16,131 @@ def retrieve_default_settings():
 
     STACK_NAME = os.getenv('STACK_NAME')
 
+    # lists of subjects are calculated with one query per chunk instead of one query per subject
+    BATCH_CALCULATION = os.getenv('BATCH_CALCULATION')
+    if BATCH_CALCULATION is None:
+        BATCH_CALCULATION = 'true'
+    BATCH_CALCULATION = BATCH_CALCULATION.lower() == 'true'
+
+    # number of subjects loaded into the session table per batched query
+    CALCULATION_CHUNK_SIZE = os.getenv('CALCULATION_CHUNK_SIZE')
+    if CALCULATION_CHUNK_SIZE is None:
+        CALCULATION_CHUNK_SIZE = 10000
+    CALCULATION_CHUNK_SIZE = int(CALCULATION_CHUNK_SIZE)
+
+    # maximum number of PostGIS connections used concurrently for the chunks of a calculation
+    CALCULATION_WORKERS = os.getenv('CALCULATION_WORKERS')
+    if CALCULATION_WORKERS is None:
+        CALCULATION_WORKERS = 4
+    CALCULATION_WORKERS = int(CALCULATION_WORKERS)
+
+    # keep projected copies of vector exposure datasets between requests instead of per-request temp tables
+    EXPOSURE_CACHE = os.getenv('EXPOSURE_CACHE')
+    if EXPOSURE_CACHE is None:
+        EXPOSURE_CACHE = 'true'
+    EXPOSURE_CACHE = EXPOSURE_CACHE.lower() == 'true'
+
+    # per-subject queries are prepared once on the server instead of being sent in full for every subject
+    PREPARED_STATEMENTS = os.getenv('PREPARED_STATEMENTS')
+    if PREPARED_STATEMENTS is None:
+        PREPARED_STATEMENTS = 'true'
+    PREPARED_STATEMENTS = PREPARED_STATEMENTS.lower() == 'true'
+
+    # number of prepared statement executions sent to the server in one round trip
+    PIPELINE_DEPTH = os.getenv('PIPELINE_DEPTH')
+    if PIPELINE_DEPTH is None:
+        PIPELINE_DEPTH = 100
+    PIPELINE_DEPTH = int(PIPELINE_DEPTH)
+
+    # memory budget (MB) of the in-memory cache of subject buffers
+    BUFFER_CACHE_SIZE = os.getenv('BUFFER_CACHE_SIZE')
+    if BUFFER_CACHE_SIZE is None:
+        BUFFER_CACHE_SIZE = 256
+    BUFFER_CACHE_SIZE = float(BUFFER_CACHE_SIZE)
+
+    # also keep subject buffers in a PostGIS table so that they survive restarts
+    BUFFER_CACHE_TABLE = os.getenv('BUFFER_CACHE_TABLE')
+    if BUFFER_CACHE_TABLE is None:
+        BUFFER_CACHE_TABLE = 'false'
+    BUFFER_CACHE_TABLE = BUFFER_CACHE_TABLE.lower() == 'true'
+
+    # keep subject geometries in PostGIS instead of querying the knowledge graph for every calculation
+    SUBJECT_STORE = os.getenv('SUBJECT_STORE')
+    if SUBJECT_STORE is None:
+        SUBJECT_STORE = 'true'
+    SUBJECT_STORE = SUBJECT_STORE.lower() == 'true'
+
+    # seconds after which a stored subject geometry is fetched again from the knowledge graph
+    SUBJECT_GEOMETRY_TTL = os.getenv('SUBJECT_GEOMETRY_TTL')
+    if SUBJECT_GEOMETRY_TTL is None:
+        SUBJECT_GEOMETRY_TTL = 86400
+    SUBJECT_GEOMETRY_TTL = float(SUBJECT_GEOMETRY_TTL)
+
+    # SPARQL endpoints (outgoing, ontop) queried with the Python HTTP client instead of the Java RemoteStoreClient
+    NATIVE_SPARQL = os.getenv('NATIVE_SPARQL')
+    if NATIVE_SPARQL is None:
+        NATIVE_SPARQL = 'outgoing,ontop'
+    NATIVE_SPARQL = [e.strip().lower() for e in NATIVE_SPARQL.split(',') if e.strip()]
+
+    # maximum number of keep-alive connections per SPARQL endpoint of the Python client
+    SPARQL_POOL_SIZE = os.getenv('SPARQL_POOL_SIZE')
+    if SPARQL_POOL_SIZE is None:
+        SPARQL_POOL_SIZE = 10
+    SPARQL_POOL_SIZE = int(SPARQL_POOL_SIZE)
+
+    # maximum number of chunked SPARQL lookups running at the same time, kept low to protect Ontop
+    SPARQL_MAX_IN_FLIGHT = os.getenv('SPARQL_MAX_IN_FLIGHT')
+    if SPARQL_MAX_IN_FLIGHT is None:
+        SPARQL_MAX_IN_FLIGHT = 4
+    SPARQL_MAX_IN_FLIGHT = int(SPARQL_MAX_IN_FLIGHT)
+
+    # seconds without a response after which a query of the Python SPARQL client times out
+    SPARQL_TIMEOUT = os.getenv('SPARQL_TIMEOUT')
+    if SPARQL_TIMEOUT is None:
+        SPARQL_TIMEOUT = 600
+    SPARQL_TIMEOUT = float(SPARQL_TIMEOUT)
+
+    # bounds of the number of VALUES per chunked SPARQL lookup, the size in between is tuned at runtime
+    SPARQL_MIN_CHUNK_SIZE = os.getenv('SPARQL_MIN_CHUNK_SIZE')
+    if SPARQL_MIN_CHUNK_SIZE is None:
+        SPARQL_MIN_CHUNK_SIZE = 100
+    SPARQL_MIN_CHUNK_SIZE = int(SPARQL_MIN_CHUNK_SIZE)
+
+    SPARQL_MAX_CHUNK_SIZE = os.getenv('SPARQL_MAX_CHUNK_SIZE')
+    if SPARQL_MAX_CHUNK_SIZE is None:
+        SPARQL_MAX_CHUNK_SIZE = 50000
+    SPARQL_MAX_CHUNK_SIZE = int(SPARQL_MAX_CHUNK_SIZE)
+
+    # chunks keep growing while a query takes less than this (seconds)
+    SPARQL_TARGET_LATENCY = os.getenv('SPARQL_TARGET_LATENCY')
+    if SPARQL_TARGET_LATENCY is None:
+        SPARQL_TARGET_LATENCY = 30
+    SPARQL_TARGET_LATENCY = float(SPARQL_TARGET_LATENCY)
+
+    # approximate length (metres) of the segments trips are split into in batched trajectory calculations, 0 to disable
+    TRAJECTORY_SEGMENT_LENGTH = os.getenv('TRAJECTORY_SEGMENT_LENGTH')
+    if TRAJECTORY_SEGMENT_LENGTH is None:
+        TRAJECTORY_SEGMENT_LENGTH = 0
+    TRAJECTORY_SEGMENT_LENGTH = float(TRAJECTORY_SEGMENT_LENGTH)
+
+    # aeqd projects the exposure dataset per trajectory, utm uses cached copies per UTM zone
+    TRAJECTORY_ENGINE = os.getenv('TRAJECTORY_ENGINE')
+    if TRAJECTORY_ENGINE is None:
+        TRAJECTORY_ENGINE = 'aeqd'
+    TRAJECTORY_ENGINE = TRAJECTORY_ENGINE.lower()
+
+    # number of trajectories calculated at the same time when a list of trajectories is given
+    TRAJECTORY_WORKERS = os.getenv('TRAJECTORY_WORKERS')
+    if TRAJECTORY_WORKERS is None:
+        TRAJECTORY_WORKERS = 4
+    TRAJECTORY_WORKERS = int(TRAJECTORY_WORKERS)
+
+    # number of trajectory time series read at the same time
+    TIME_SERIES_MAX_IN_FLIGHT = os.getenv('TIME_SERIES_MAX_IN_FLIGHT')
+    if TIME_SERIES_MAX_IN_FLIGHT is None:
+        TIME_SERIES_MAX_IN_FLIGHT = 2
+    TIME_SERIES_MAX_IN_FLIGHT = int(TIME_SERIES_MAX_IN_FLIGHT)
+
 
 # run when module is imported
 retrieve_default_settings()
@@ -1,15 +1,19 @@
-from agent.objects.time_series import TimeSeries
+from agent.objects.time_series import TimeSeries, check_aligned, parse_timestamps
 from agent.utils.stack_gateway import stack_clients_view
 from agent.utils.stack_configs import BLAZEGRAPH_URL, STACK_OUTGOING, ONTOP_URL
-from agent.utils.env_configs import NAMESPACE
+from agent.utils.env_configs import NAMESPACE, NATIVE_SPARQL, SPARQL_MAX_IN_FLIGHT, SPARQL_POOL_SIZE, SPARQL_TIMEOUT
+from agent.utils.sparql_client import SparqlClient
+from agent.utils.adaptive_chunker import get_tuner, is_overload
 import agent.utils.constants as constants
 from twa import agentlogging
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from urllib.parse import urlsplit
 from py4j.java_gateway import JavaObject
 import json
-from datetime import datetime
+import numpy as np
 
 logger = agentlogging.get_logger('dev')
 
@@ -24,6 +28,19 @@ class KgClient():
             STACK_OUTGOING, BLAZEGRAPH_URL))
         self.ontop_client = stack_clients_view.RemoteStoreClient(ONTOP_URL)
 
+        # pure Python clients for the endpoints listed in NATIVE_SPARQL, the others go through the Java client
+        self.native_clients = {}
+        if 'outgoing' in NATIVE_SPARQL:
+            self.native_clients['outgoing'] = SparqlClient(
+                STACK_OUTGOING, pool_size=SPARQL_POOL_SIZE, timeout=SPARQL_TIMEOUT)
+        if 'ontop' in NATIVE_SPARQL:
+            self.native_clients['ontop'] = SparqlClient(
+                ONTOP_URL, pool_size=SPARQL_POOL_SIZE, timeout=SPARQL_TIMEOUT)
+
+        # chunks in flight per endpoint, shared by all concurrent lookups (e.g. requests, trajectory workers)
+        self.in_flight = {endpoint: threading.BoundedSemaphore(SPARQL_MAX_IN_FLIGHT)
+                          for endpoint in ['outgoing', 'ontop']}
+
         # check if namespace exists, if not initialise
         r = requests.head(BLAZEGRAPH_URL)
 
@@ -46,6 +63,99 @@ class KgClient():
                 raise RuntimeError(
                     f"Failed to create namespace '{NAMESPACE}': {r.status_code} {r.text}")
 
+    def query(self, query: str, endpoint: str = 'outgoing'):
+        """
+        Returns a list of rows (dictionary of variable to value), endpoint is either
+        'outgoing' (the outgoing federation) or 'ontop'
+        """
+        return list(self.iter_query(query, endpoint))
+
+    def iter_query(self, query: str, endpoint: str = 'outgoing'):
+        # the native client yields rows as they arrive, the Java client returns the full result
+        if endpoint in self.native_clients:
+            yield from self.native_clients[endpoint].iter_query(query)
+        elif endpoint == 'outgoing':
+            yield from json.loads(self.remote_store_client.executeQuery(query).toString())
+        elif endpoint == 'ontop':
+            yield from json.loads(self.ontop_client.executeQuery(query).toString())
+        else:
+            raise KgClientException(f"Unknown SPARQL endpoint: {endpoint}")
+
+    def query_values(self, values: list, build_query, shape: str, endpoint: str = 'outgoing', initial_chunk_size: int = 10000,
+                     max_retries=3, delay=10):
+        """
+        Executes a lookup split into chunks of values, build_query(chunk) returns the query of a chunk.
+        The chunk size is tuned per endpoint and shape (e.g. 'subject_geometry'), at most SPARQL_MAX_IN_FLIGHT
+        chunks run at the same time per endpoint, across all calls. Returns the list of rows of each chunk in the order of values,
+        a chunk that overloads the endpoint is split in half, other failures are retried on their own
+        """
+        if endpoint not in self.in_flight:
+            raise KgClientException(f"Unknown SPARQL endpoint: {endpoint}")
+        tuner = get_tuner(endpoint, shape, initial_chunk_size)
+        lock = threading.Lock()
+        failed = threading.Event()
+        pending = []  # halves of split chunks, taken before new values
+        position = 0
+        start_to_rows = {}
+
+        def take_chunk():
+            nonlocal position
+            with lock:
+                if failed.is_set():
+                    return None
+                if pending:
+                    return pending.pop()
+                if position >= len(values):
+                    return None
+                size = tuner.get_size()
+                chunk = (position, values[position:position + size])
+                position += size
+                return chunk
+
+        def run():
+            while (chunk := take_chunk()) is not None:
+                start, chunk_values = chunk
+                attempt = 0
+                while True:
+                    try:
+                        with self.in_flight[endpoint]:
+                            # latency without the time waiting for a slot
+                            query_start = time.monotonic()
+                            rows = self.query(
+                                build_query(chunk_values), endpoint)
+                    except Exception as e:
+                        if is_overload(e) and len(chunk_values) > 1:
+                            tuner.record_overload(len(chunk_values))
+                            half = len(chunk_values) // 2
+                            with lock:
+                                pending.append(
+                                    (start + half, chunk_values[half:]))
+                            chunk_values = chunk_values[:half]
+                            continue
+
+                        attempt += 1
+                        logger.warning(
+                            f"Chunk query attempt {attempt} failed: {e}")
+                        if attempt == max_retries:
+                            failed.set()
+                            raise
+                        time.sleep(delay)
+                        continue
+
+                    tuner.record_success(
+                        len(chunk_values), time.monotonic() - query_start)
+                    with lock:
+                        start_to_rows[start] = rows
+                    break
+
+        with ThreadPoolExecutor(max_workers=SPARQL_MAX_IN_FLIGHT) as executor:
+            futures = [executor.submit(run)
+                       for _ in range(SPARQL_MAX_IN_FLIGHT)]
+        for future in futures:
+            future.result()
+
+        return [start_to_rows[start] for start in sorted(start_to_rows)]
+
     def get_time_series(self, iri: str):
         query = f"""
         SELECT ?time_series
@@ -70,7 +180,8 @@ class KgClient():
         query_results = self.remote_store_client.executeQuery(query)
         return query_results.getJSONObject(0).getString('time_class')
 
-    def get_time_series_data(self, measures, lowerbound, upperbound):
+    def get_time_series_data(self, measures, lowerbound, upperbound, raw: bool = False):
+        # with raw, values and time literals are also kept as received, e.g. to be exported unchanged
         values_clause = " ".join(f"<{s}>" for s in measures)
         conditions = []
 
@@ -111,62 +222,44 @@ class KgClient():
         ORDER BY ?timestamp ?time_number
         """
 
-        query_results = kg_client.remote_store_client.executeQuery(query)
-        query_results_parsed = json.loads(query_results.toString())
-
-        time_series = TimeSeries()
-        time_number_dict = {}
         timestamp_dict = {}
+        time_number_dict = {}
         value_dict = {}
 
-        for entry in query_results_parsed:
+        # rows are processed while the result is being received
+        for entry in self.iter_query(query):
             measure = entry['measure']
-
-            if measure in value_dict.keys():
-                value_dict[measure].append(entry['val'])
-            else:
-                value_dict[measure] = [entry['val']]
+            value_dict.setdefault(measure, []).append(entry['val'])
 
             if 'timestamp' in entry:
-                if measure in timestamp_dict.keys():
-                    timestamp_dict[measure].append(entry['timestamp'])
-                else:
-                    timestamp_dict[measure] = [entry['timestamp']]
+                timestamp_dict.setdefault(
+                    measure, []).append(entry['timestamp'])
 
             if 'time_number' in entry:
-                if measure in time_number_dict.keys():
-                    time_number_dict[measure].append(entry['time_number'])
-                else:
-                    time_number_dict[measure] = [entry['time_number']]
-
-        timestamp_list_list = []
-        time_number_list_list = []
-        for measure in measures:
-            if measure in timestamp_dict.keys():
-                timestamp_list = [datetime.fromisoformat(
-                    s) for s in timestamp_dict[measure]]
-                timestamp_list_list.append(timestamp_list)
-                time_series.add_timestamp_java(measure, self.convert_input_time_for_timeseries(
-                    timestamp_dict[measure], measure))
-                time_series.add_timestamp(measure, timestamp_list)
-
-            if measure in time_number_dict.keys():
-                time_number_list = [float(s)
-                                    for s in time_number_dict[measure]]
-                time_number_list_list.append(time_number_list)
-                time_series.add_time_number(measure, time_number_list)
+                time_number_dict.setdefault(
+                    measure, []).append(entry['time_number'])
+
+        present = [measure for measure in measures if measure in value_dict]
+        if timestamp_dict:
+            time_arrays = [parse_timestamps(timestamp_dict[measure])
+                           for measure in present if measure in timestamp_dict]
+        elif time_number_dict:
+            time_arrays = [np.asarray(time_number_dict[measure], dtype=float)
+                           for measure in present if measure in time_number_dict]
+        else:
+            time_arrays = [np.array([], dtype='datetime64[us]')]
 
-            time_series.add_value(measure, value_dict[measure])
+        # check all time arrays are equal
+        check_aligned(time_arrays)
 
-        if timestamp_list_list:
-            # check all time lists are equal
-            if not all(inner == timestamp_list_list[0] for inner in timestamp_list_list):
-                raise Exception('Unexpected timestamp list size')
+        raw_times = None
+        if raw:
+            raw_times = next((timestamp_dict[measure] for measure in present if measure in timestamp_dict), [])
 
-        if time_number_list_list:
-            # check all time lists are the same
-            if not all(inner == time_number_list_list[0] for inner in time_number_list_list):
-                raise Exception('Unexpected time number list size')
+        time_series = TimeSeries(time_arrays[0], java_time_converter=lambda time_list: self.convert_input_time_for_timeseries(
+            time_list, measures[0]), raw_times=raw_times)
+        for measure in present:
+            time_series.add_value(measure, value_dict[measure])
 
         return time_series
 
@@ -193,9 +286,7 @@ class KgClient():
         }}
         """
 
-        query_results = kg_client.remote_store_client.executeQuery(query)
-
-        query_results_parsed = json.loads(query_results.toString())
+        query_results_parsed = self.query(query)
 
         if query_results_parsed:
             time_class = query_results_parsed[0]['time_class']
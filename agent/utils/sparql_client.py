@@ -0,0 +1,98 @@
+import re
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from twa import agentlogging
+
+logger = agentlogging.get_logger('dev')
+
+# escape sequences of quoted literals in SPARQL TSV results (Turtle syntax)
+ESCAPE_PATTERN = re.compile(r'\\(u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|.)')
+ESCAPE_CHARACTERS = {'t': '\t', 'n': '\n', 'r': '\r',
+                     'b': '\b', 'f': '\f', '"': '"', "'": "'", '\\': '\\'}
+
+
+class SparqlClient:
+    """
+    SPARQL client over HTTP with a pooled keep-alive session, results are requested as gzipped TSV
+    and parsed line by line. Rows have the same form as the JSON rows returned by the Java
+    RemoteStoreClient, i.e. a dictionary of variable to value, unbound variables are left out
+    """
+
+    def __init__(self, endpoint: str, pool_size: int = 10, timeout: float = None, max_retries=3, delay=10):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.delay = delay
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Accept': 'text/tab-separated-values',
+                                     'Accept-Encoding': 'gzip'})
+
+    def iter_query(self, query: str):
+        # yields rows while the response is being received
+        response = self._post(query)
+        try:
+            lines = response.iter_lines(decode_unicode=True)
+            header = next(lines, None)
+            if header is None:
+                return
+            variables = [v.lstrip('?$') for v in header.split('\t')]
+
+            for line in lines:
+                if not line:
+                    continue
+                row = {}
+                for variable, term in zip(variables, line.split('\t')):
+                    if term:
+                        row[variable] = _parse_term(term)
+                yield row
+        finally:
+            response.close()
+
+    def query(self, query: str):
+        return list(self.iter_query(query))
+
+    def _post(self, query: str):
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                response = self.session.post(
+                    self.endpoint, data={'query': query}, stream=True, timeout=self.timeout)
+                response.raise_for_status()
+                # TSV is UTF-8 by definition
+                response.encoding = 'utf-8'
+                return response
+            except requests.Timeout:
+                # timeouts and error responses (e.g. 503 of an overloaded endpoint) are left to the caller,
+                # e.g. kg_client.query_values retries them with a smaller chunk
+                raise
+            except requests.ConnectionError as e:
+                # no response, e.g. a pooled keep-alive connection closed by the server
+                logger.warning(f"Attempt {attempt} failed: {e}")
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.delay)
+
+
+def _parse_term(term: str):
+    # IRI
+    if term.startswith('<') and term.endswith('>'):
+        return term[1:-1]
+
+    # literal, possibly with a language tag or datatype
+    if term.startswith('"'):
+        return ESCAPE_PATTERN.sub(_unescape, term[1:term.rindex('"')])
+
+    # numbers and booleans in short form, blank nodes
+    return term
+
+
+def _unescape(match):
+    escaped = match.group(1)
+    if escaped[0] in 'uU' and len(escaped) > 1:
+        return chr(int(escaped[1:], 16))
+    return ESCAPE_CHARACTERS.get(escaped, escaped)
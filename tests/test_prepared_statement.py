@@ -0,0 +1,67 @@
+# checks how execute_per_subject batches per-subject queries, run with: python -m unittest discover tests
+import unittest
+from unittest import mock
+from agent.calculation import prepared_statement
+from agent.calculation.prepared_statement import execute_per_subject
+
+COUNT_SQL = """SELECT COUNT(*) AS intersection_count
+FROM exposure
+WHERE ST_DWithin(wkb_geometry, ST_GeomFromWKB(%(GEOMETRY_PLACEHOLDER)s, 3857), %(DISTANCE_PLACEHOLDER)s);
+"""
+
+
+class StandInCursor:
+    # answers each batch with one row per key, the count is the length of the geometry
+    def __init__(self, fail_on=None):
+        self.statements = []
+        self.fail_on = fail_on
+        self.rows = []
+
+    def execute(self, sql, params):
+        self.statements.append((sql, params))
+        if self.fail_on in params['PIPELINE_GEOMETRY_PLACEHOLDER']:
+            raise RuntimeError('invalid geometry')
+        self.rows = [(key, len(wkb)) for key, wkb in zip(
+            params['PIPELINE_KEYS'], params['PIPELINE_GEOMETRY_PLACEHOLDER'])]
+
+    def fetchall(self):
+        return self.rows
+
+
+class ExecutePerSubjectTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(prepared_statement, 'PIPELINE_DEPTH', 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.key_to_params = {iri: {'GEOMETRY_PLACEHOLDER': wkb, 'DISTANCE_PLACEHOLDER': 100.0}
+                              for iri, wkb in [('a', b'1'), ('b', b'22'), ('c', b'333')]}
+
+    def test_one_statement_per_chunk(self):
+        cur = StandInCursor()
+        key_to_rows = execute_per_subject(
+            cur, 'count', COUNT_SQL, self.key_to_params)
+
+        self.assertEqual(key_to_rows, {'a': [(1,)], 'b': [(2,)], 'c': [(3,)]})
+        self.assertEqual(len(cur.statements), 2)
+
+        sql, params = cur.statements[0]
+        self.assertIn('unnest(%(PIPELINE_KEYS)s::text[], %(PIPELINE_GEOMETRY_PLACEHOLDER)s)', sql)
+        self.assertIn('ST_GeomFromWKB(count_params.p_geometry_placeholder, 3857)', sql)
+        # the distance is the same for all subjects and stays a scalar parameter
+        self.assertIn('%(DISTANCE_PLACEHOLDER)s', sql)
+        self.assertEqual(params['DISTANCE_PLACEHOLDER'], 100.0)
+        self.assertEqual(params['PIPELINE_KEYS'], ['a', 'b'])
+
+    def test_failing_subject_fails_its_chunk(self):
+        cur = StandInCursor(fail_on=b'333')
+        with self.assertRaises(RuntimeError):
+            execute_per_subject(cur, 'count', COUNT_SQL, self.key_to_params)
+        self.assertEqual(len(cur.statements), 2)
+
+    def test_empty(self):
+        self.assertEqual(execute_per_subject(
+            StandInCursor(), 'count', COUNT_SQL, {}), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
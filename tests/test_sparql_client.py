@@ -0,0 +1,72 @@
+# checks SparqlClient against a local stand-in SPARQL server, run with: python -m unittest discover tests
+import gzip
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import requests
+from agent.utils.sparql_client import SparqlClient
+
+TSV_RESULT = ('?subject\t?wkt\t?count\n'
+              '<http://subject/1>\t"POINT(1 2)"^^<http://www.opengis.net/ont/geosparql#wktLiteral>\t5\n'
+              '<http://subject/2>\t"tab\\there \\"quoted\\" \\u00e9"@en\t\n')
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # responses are taken from the server, one per request, the last one is repeated
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.queries += 1
+        status, body = self.server.responses[min(
+            self.server.queries, len(self.server.responses)) - 1]
+
+        data = gzip.compress(body.encode('utf-8'))
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/tab-separated-values')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class SparqlClientTest(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), StandInHandler)
+        self.server.queries = 0
+        self.server.responses = [(200, TSV_RESULT)]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = SparqlClient(
+            f"http://127.0.0.1:{self.server.server_port}/sparql", delay=0)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_rows(self):
+        rows = self.client.query('SELECT * WHERE {?s ?p ?o}')
+        self.assertEqual(rows, [
+            {'subject': 'http://subject/1', 'wkt': 'POINT(1 2)', 'count': '5'},
+            {'subject': 'http://subject/2', 'wkt': 'tab\there "quoted" \u00e9'}])
+
+    def test_pooled_connection_reused(self):
+        for _ in range(3):
+            self.assertEqual(len(self.client.query('SELECT *')), 2)
+        self.assertEqual(self.server.queries, 3)
+
+    def test_overload_not_retried(self):
+        # the caller decides how to retry, e.g. with a smaller chunk
+        self.server.responses = [(503, 'Service Unavailable')]
+        with self.assertRaises(requests.HTTPError) as context:
+            self.client.query('SELECT *')
+        self.assertEqual(context.exception.response.status_code, 503)
+        self.assertEqual(self.server.queries, 1)
+
+    def test_empty_result(self):
+        self.server.responses = [(200, '')]
+        self.assertEqual(self.client.query('SELECT *'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+# checks that exported times and values match what the Java time classes wrote, run with: python -m unittest discover tests
+import unittest
+import numpy as np
+from agent.objects.time_series import TimeSeries, parse_timestamps
+
+RAW_TIMES = ['2020-01-01T00:00:00Z', '2020-01-01T00:00:00.500Z',
+             '2020-01-01T00:01:30.123456Z', '2020-01-01T01:00:00+01:00']
+
+
+class JavaTimeStringTest(unittest.TestCase):
+    def setUp(self):
+        self.time_series = TimeSeries(parse_timestamps(RAW_TIMES), raw_times=RAW_TIMES)
+        self.time_series.add_value('measure', ['1', '2.50', '1e3', 'POINT(1 2)'])
+
+    def test_instant(self):
+        self.assertEqual(self.time_series.get_java_time_strings('java.time.Instant'), [
+            '2020-01-01T00:00:00Z', '2020-01-01T00:00:00.500Z',
+            '2020-01-01T00:01:30.123456Z', '2020-01-01T00:00:00Z'])
+
+    def test_zoned_date_time(self):
+        # seconds are left out when zero and the received offset is kept
+        self.assertEqual(self.time_series.get_java_time_strings('java.time.ZonedDateTime'), [
+            '2020-01-01T00:00Z', '2020-01-01T00:00:00.500Z',
+            '2020-01-01T00:01:30.123456Z', '2020-01-01T01:00+01:00'])
+
+    def test_numeric_time(self):
+        time_series = TimeSeries(np.array([1.0, 2.5]))
+        self.assertEqual(time_series.get_java_time_strings(None), ['1.0', '2.5'])
+
+    def test_raw_values(self):
+        self.assertEqual(self.time_series.get_value_list('measure').tolist(),
+                         ['1', '2.50', '1e3', 'POINT(1 2)'])
+
+    def test_typed_values(self):
+        time_series = TimeSeries(parse_timestamps(RAW_TIMES[:2]))
+        time_series.add_value('measure', ['1', '2'])
+        self.assertEqual(time_series.get_value_list('measure').dtype, np.int64)
+
+
+if __name__ == '__main__':
+    unittest.main()